@@ -10,15 +10,21 @@ from django.contrib import admin, messages
 from django.db import IntegrityError
 from django.template.response import TemplateResponse
 from django.shortcuts import redirect, get_object_or_404
-from django.urls import path
+from django.urls import path, reverse
 from django.utils.html import format_html
 from django.utils import timezone
 
 from .models import (
     Category, Banner, Brand, Product,
-    Quotation, QuotationLine, OrderStatus
+    Quotation, QuotationLine, OrderStatus, Job, JobStatus,
+    OutboxEmail, OutboxStatus,
 )
-from .forms import BrandForm, ProductForm, QuotationHeaderForm
+from .forms import (
+    BrandForm, ProductForm, QuotationHeaderForm,
+    PricedProductChoiceField, ProductSelectWidget, SharedProductChoicesFormSet,
+)
+from .export import export_response
+from .importer import CatalogImportError, import_catalog, read_rows
 
 ###############################################
 # CATEGORY, BANNER, BRAND, & PRODUCT ADMIN
@@ -31,7 +37,9 @@ class SubCategoryInline(admin.TabularInline):
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'parent')
+    list_display = ('name', 'parent', 'depth')
+    # Path order lists every category directly after its parent.
+    ordering = ('path',)
     inlines = [SubCategoryInline]
 
 @admin.register(Banner)
@@ -47,6 +55,10 @@ class ProductForm(forms.ModelForm):
         model = Product
         fields = '__all__'
 
+class CatalogImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or XLSX with an 'sku' column; same columns as the catalog export.")
+    dry_run = forms.BooleanField(required=False, initial=True, label="Dry run (show the changes only)")
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     form = ProductForm
@@ -76,6 +88,7 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
     change_form_template = "admin/eshop/product/change_form.html"
+    change_list_template = "admin/eshop/product/change_list.html"
 
     def get_urls(self):
         urls = super().get_urls()
@@ -85,6 +98,11 @@ class ProductAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.clone_view),
                 name='eshop_product_clone'
             ),
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_view),
+                name='eshop_product_import'
+            ),
         ]
         return custom_urls + urls
 
@@ -139,6 +157,29 @@ class ProductAdmin(admin.ModelAdmin):
         )
         return redirect(f'../../{original_product.pk}/change/')
 
+    def import_view(self, request):
+        """Upload a CSV/XLSX price list; dry run by default, see eshop/importer.py."""
+        report = None
+        form = CatalogImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                report = import_catalog(read_rows(upload, upload.name), dry_run=form.cleaned_data['dry_run'])
+            except (CatalogImportError, IntegrityError) as e:
+                messages.error(request, f"Nothing was imported: {e}")
+            else:
+                level = messages.WARNING if report.errors else messages.SUCCESS
+                messages.add_message(request, level, report.summary())
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Import catalog",
+            'form': form,
+            'report': report,
+            'diff_lines': list(report.diff_lines()) if report else [],
+        }
+        return TemplateResponse(request, "admin/eshop/product/import.html", context)
+
     def clone_link(self, obj):
         url = f"{obj.pk}/clone/"
         return format_html(
@@ -147,6 +188,16 @@ class ProductAdmin(admin.ModelAdmin):
         )
     clone_link.short_description = "Clone"
 
+    actions = ['export_csv', 'export_jsonl']
+
+    @admin.action(description="Export selected products as CSV")
+    def export_csv(self, request, queryset):
+        return export_response('csv', queryset)
+
+    @admin.action(description="Export selected products as JSON Lines")
+    def export_jsonl(self, request, queryset):
+        return export_response('jsonl', queryset)
+
 ###############################################
 # ACCOUNTING API HELPER FUNCTIONS
 ###############################################
@@ -280,23 +331,12 @@ def create_sales_order_in_accounting(customer_key, order):
 # AUTO-FILL PRICE LOGIC FOR QuotationLine
 ###############################################
 
-# 1. Custom widget to attach data-price on <option>
-class ProductSelectWidget(forms.Select):
-    def create_option(self, name, value, label, selected, index, subindex=None, attrs=None):
-        option = super().create_option(name, value, label, selected, index, subindex, attrs)
-        if value:
-            # Extract the actual value in case it's a ModelChoiceIteratorValue
-            actual_value = getattr(value, 'value', value)
-            try:
-                product = self.choices.queryset.get(pk=actual_value)
-                option['attrs']['data-price'] = str(product.original_price or 0)
-            except Product.DoesNotExist:
-                pass
-        return option
+# 1. The priced product field, data-price widget and shared-choices formset
+#    live in forms.py and are used by the storefront form as well.
 
 # 2. Custom form for QuotationLine with server-side fallback
 class QuotationLineForm(forms.ModelForm):
-    product = forms.ModelChoiceField(
+    product = PricedProductChoiceField(
         queryset=Product.objects.all(),
         widget=ProductSelectWidget(attrs={'class': 'form-select product-select'})
     )
@@ -341,6 +381,7 @@ QuotationLineFormSet = inlineformset_factory(
     Quotation,
     QuotationLine,
     form=QuotationLineForm,
+    formset=SharedProductChoicesFormSet,
     extra=1,
     can_delete=True
 )
@@ -349,6 +390,7 @@ QuotationLineFormSet = inlineformset_factory(
 class QuotationLineInline(admin.TabularInline):
     model = QuotationLine
     form = QuotationLineForm
+    formset = SharedProductChoicesFormSet
     extra = 0
     # Optionally, set prefix if needed:
     # prefix = "lines"  # Uncomment if you want to force the prefix to "lines"
@@ -414,10 +456,16 @@ class QuotationAdmin(admin.ModelAdmin):
             'fields': ('order_number', 'subject', 'status', 'notes')
         }),
         ('Totals', {
-            'fields': ('total_amount', 'created_at')
+            'fields': ('total_amount', 'created_at', 'pdf_link')
         }),
     )
-    readonly_fields = ('created_at', 'total_amount',)
+    readonly_fields = ('created_at', 'total_amount', 'pdf_link')
+
+    @admin.display(description="PDF")
+    def pdf_link(self, obj):
+        if not obj.pk:
+            return "-"
+        return format_html('<a href="{}">Download PDF</a>', reverse('quotation_pdf', args=[obj.pk]))
 
     def save_model(self, request, obj, form, change):
         if not obj.order_number:
@@ -452,3 +500,39 @@ class QuotationAdmin(admin.ModelAdmin):
 @admin.register(QuotationLine)
 class QuotationLineAdmin(admin.ModelAdmin):
     list_display = ('quotation', 'product', 'quantity', 'unit_price', 'discount_percent')
+
+###############################################
+# BACKGROUND JOBS & EMAIL OUTBOX
+###############################################
+
+@admin.action(description="Retry selected jobs now")
+def retry_jobs(modeladmin, request, queryset):
+    count = queryset.exclude(status=JobStatus.RUNNING).update(
+        status=JobStatus.QUEUED, run_after=timezone.now(), attempts=0, last_error='',
+    )
+    messages.success(request, f"{count} job(s) queued again.")
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'quotation', 'status', 'attempts', 'run_after', 'updated_at')
+    list_filter = ('status', 'name')
+    search_fields = ('quotation__order_number', 'last_error')
+    raw_id_fields = ('quotation',)
+    readonly_fields = ('created_at', 'updated_at', 'locked_by', 'locked_at', 'result', 'last_error')
+    actions = [retry_jobs]
+
+@admin.action(description="Send selected emails again")
+def resend_emails(modeladmin, request, queryset):
+    count = queryset.exclude(status=OutboxStatus.SENDING).update(
+        status=OutboxStatus.PENDING, next_attempt_at=timezone.now(), attempts=0, last_error='',
+    )
+    messages.success(request, f"{count} email(s) queued again.")
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'quotation', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'quotation__order_number', 'last_error')
+    raw_id_fields = ('quotation',)
+    readonly_fields = ('created_at', 'sent_at', 'locked_at', 'last_error')
+    actions = [resend_emails]
@@ -1,11 +1,218 @@
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework import generics
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .autocomplete import DEFAULT_LIMIT, autocomplete
+from .fast_serializers import format_datetime, format_decimal, product_values, select_fields, serialize_products
+from .graph import COMPATIBLE, DEFAULT_DEPTH, MAX_DEPTH, RELATIONS, compatible_products
 from .models import Product
-from .serializers import ProductSerializer
+from .pagination import ProductCursorPagination, paginate_keyset
+from .renderers import FastJSONRenderer
+from .search import search_products
+from .serializers import ProductSerializer, requested_fields
+from .sync import DEFAULT_PAGE_SIZE as SYNC_PAGE_SIZE, MAX_PAGE_SIZE as SYNC_MAX_PAGE_SIZE, changes_since, decode_watermark
+
+# Keeps one lookup to a single bounded IN query and response.
+BATCH_LOOKUP_LIMIT = 500
+# Rows per page of the quotation form's product search box.
+PRODUCT_SEARCH_PAGE_SIZE = 20
+PRODUCT_SEARCH_MAX_PAGE_SIZE = 50
 
 class ProductListAPIView(generics.ListAPIView):
+    """
+    GET /api/products/?cursor=...&page_size=N&fields=sku,name,original_price
+    One page costs the same few queries however large the catalog is. Rows
+    come from .values() through the fast path in eshop/fast_serializers.py,
+    which emits exactly what ProductSerializer would; the M2M id lists are
+    only looked up when they are part of the requested fields.
+    """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    pagination_class = ProductCursorPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        fields = select_fields(requested_fields(request))
+        queryset = product_values(self.filter_queryset(self.get_queryset()), fields)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(serialize_products(page, request, fields))
+
+
+class ProductChangesAPIView(APIView):
+    """
+    GET /api/products/changes/?since=<watermark>&limit=N&fields=...
+    -> {"changed": [product...], "deleted": [{"id", "sku", "deleted_at"}],
+        "watermark": "...", "has_more": bool}
+    `since` is the watermark from the previous call, or an ISO 8601 timestamp
+    for the first one (omit it for a full download). Call again with the new
+    watermark while has_more is true. See eshop/sync.py.
+    """
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get(self, request):
+        watermark = decode_watermark(request.query_params.get('since'))
+        if watermark is None:
+            raise ValidationError({'since': "Not a watermark or an ISO 8601 timestamp."})
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', SYNC_PAGE_SIZE)), SYNC_MAX_PAGE_SIZE))
+        except ValueError:
+            limit = SYNC_PAGE_SIZE
+        fields = select_fields(requested_fields(request))
+        changes = changes_since(watermark, fields, limit)
+        return Response({
+            'changed': serialize_products(changes.changed, request, fields),
+            'deleted': [
+                {'id': row['product_id'], 'sku': row['sku'], 'deleted_at': format_datetime(row['deleted_at'])}
+                for row in changes.deleted
+            ],
+            'watermark': changes.watermark,
+            'has_more': changes.has_more,
+        })
+
+
+class ProductBatchLookupAPIView(APIView):
+    """
+    POST /api/products/batch/ {"skus": [...]} or {"ids": [...]}, optionally
+    with "fields": "sku,name,original_price" (or ?fields=).
+    -> {"results": [product...], "not_found": [...]}
+    Resolved with one IN query; results follow the request order, duplicates
+    dropped. At most BATCH_LOOKUP_LIMIT keys per request.
+    """
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            raise ValidationError("Expected a JSON object with \"skus\" or \"ids\".")
+        if 'skus' in request.data:
+            key, lookup = 'skus', 'sku'
+        elif 'ids' in request.data:
+            key, lookup = 'ids', 'id'
+        else:
+            raise ValidationError({'skus': "Send a list of SKUs as \"skus\" or of ids as \"ids\"."})
+        values = request.data[key]
+        if not isinstance(values, list):
+            raise ValidationError({key: "Expected a list."})
+        if len(values) > BATCH_LOOKUP_LIMIT:
+            raise ValidationError({key: f"At most {BATCH_LOOKUP_LIMIT} per request, got {len(values)}."})
+        if key == 'skus':
+            if not all(isinstance(value, str) for value in values):
+                raise ValidationError({key: "Every SKU must be a string."})
+            wanted = list(dict.fromkeys(values))
+        else:
+            try:
+                wanted = list(dict.fromkeys(int(value) for value in values))
+            except (TypeError, ValueError):
+                raise ValidationError({key: "Every id must be an integer."})
+
+        requested = requested_fields(request)
+        if isinstance(request.data.get('fields'), str):
+            requested = {name.strip() for name in request.data['fields'].split(',') if name.strip()} or requested
+        fields = select_fields(requested)
+        rows = product_values(Product.objects.filter(**{f'{lookup}__in': wanted}), fields, extra=[lookup])
+        found = {row[lookup]: row for row in rows}
+        ordered = [found[value] for value in wanted if value in found]
+        return Response({
+            'results': serialize_products(ordered, request, fields),
+            'not_found': [value for value in wanted if value not in found],
+        })
+
 
 class ProductDetailAPIView(generics.RetrieveAPIView):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('brand', 'category').prefetch_related('related_products', 'compatible_modules')
     serializer_class = ProductSerializer
+
+class ProductAutocompleteAPIView(APIView):
+    """
+    GET ?q=<prefix>[&limit=N] -> {"results": [{"sku", "name", "url"}, ...]}
+    Served from the per-process prefix index in eshop/autocomplete.py.
+    No authentication, so the hot path never loads a session from the DB.
+    """
+    authentication_classes = []
+    permission_classes = []
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        results = autocomplete(request.query_params.get('q', ''), limit)
+        response = Response({'results': results})
+        response['Cache-Control'] = 'public, max-age=60'
+        return response
+
+class ProductSearchAPIView(APIView):
+    """
+    GET ?q=<name or SKU words>[&cursor=...&page_size=N]
+    -> {"results": [{"id", "sku", "name", "price"}, ...], "next": "<url>" | null}
+    Backs the product search box of the storefront quotation form: matches
+    come from the FTS index by relevance, an empty query lists the catalog by
+    name. Both are keyset-paginated, so a page costs the same at any depth.
+    """
+    authentication_classes = []
+    permission_classes = []
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request):
+        try:
+            page_size = int(request.query_params.get('page_size', PRODUCT_SEARCH_PAGE_SIZE))
+        except ValueError:
+            page_size = PRODUCT_SEARCH_PAGE_SIZE
+        page_size = max(1, min(page_size, PRODUCT_SEARCH_MAX_PAGE_SIZE))
+        query = request.query_params.get('q', '').strip()
+        cursor = request.query_params.get('cursor')
+        if query:
+            page = search_products(query, cursor=cursor, page_size=page_size)
+        else:
+            page = paginate_keyset(
+                Product.objects.only('id', 'sku', 'name', 'original_price'),
+                sort='name', cursor=cursor, page_size=page_size,
+            )
+
+        next_url = None
+        if page.has_next:
+            params = request.query_params.copy()
+            params['cursor'] = page.next_cursor
+            next_url = f"{request.path}?{params.urlencode()}"
+        results = [
+            {'id': product.pk, 'sku': product.sku, 'name': product.name, 'price': format_decimal(product.original_price)}
+            for product in page
+        ]
+        return Response({'results': results, 'next': next_url})
+
+class ProductCompatibilityAPIView(APIView):
+    """
+    GET /api/products/<sku>/compatibility/?depth=N&relation=compatible_modules
+    -> {"sku", "relation", "depth", "<relation>": [...], "<reverse name>": [...]}
+    Each entry is {"sku", "name", "url", "depth", "via": [sku, ...]}, nearest
+    first. Traversal runs on the cached graph in eshop/graph.py.
+    """
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request, sku):
+        product_id = get_object_or_404(Product.objects.values_list('pk', flat=True), sku=sku)
+        try:
+            depth = max(1, min(int(request.query_params.get('depth', DEFAULT_DEPTH)), MAX_DEPTH))
+        except ValueError:
+            depth = DEFAULT_DEPTH
+        relation = request.query_params.get('relation', COMPATIBLE)
+        if relation not in RELATIONS:
+            relation = COMPATIBLE
+        found = compatible_products(product_id, depth, relation, queryset=Product.objects.only('pk', 'sku', 'name'))
+        data = {'sku': sku, 'relation': relation, 'depth': depth}
+        for name, items in found.items():
+            data[name] = [
+                {
+                    'sku': item.product.sku,
+                    'name': item.product.name,
+                    'url': reverse('product_detail', args=[item.product.sku]),
+                    'depth': item.depth,
+                    'via': [hop.sku for hop in item.via],
+                }
+                for item in items
+            ]
+        return Response(data)
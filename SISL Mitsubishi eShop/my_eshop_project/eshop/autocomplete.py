@@ -0,0 +1,75 @@
+"""
+In-memory prefix index for search-as-you-type.
+
+Each worker process keeps a sorted array of normalized product names and
+SKUs and answers prefix queries with bisect, so keystrokes never reach the
+database. The index is rebuilt lazily, with a single query, the first time
+it is used after the catalog version changes (see eshop/catalog_cache.py).
+"""
+import threading
+from bisect import bisect_left
+
+from django.urls import reverse
+
+from .catalog_cache import get_version
+from .fuzzy import normalize
+from .models import Product
+
+MIN_QUERY_LENGTH = 2
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+
+class PrefixIndex:
+    """Sorted (key, entry) pairs; entries are small dicts ready to serialize."""
+
+    def __init__(self, pairs):
+        pairs = sorted(pairs, key=lambda pair: pair[0])
+        self.keys = [key for key, _ in pairs]
+        self.entries = [entry for _, entry in pairs]
+
+    def search(self, prefix, limit=DEFAULT_LIMIT):
+        results = []
+        seen = set()
+        i = bisect_left(self.keys, prefix)
+        while i < len(self.keys) and self.keys[i].startswith(prefix) and len(results) < limit:
+            entry = self.entries[i]
+            if entry['sku'] not in seen:
+                seen.add(entry['sku'])
+                results.append(entry)
+            i += 1
+        return results
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def build_index():
+    pairs = []
+    for sku, name in Product.objects.values_list('sku', 'name').iterator():
+        entry = {'sku': sku, 'name': name, 'url': reverse('product_detail', args=[sku])}
+        for key in {normalize(name), normalize(sku)}:
+            if key:
+                pairs.append((key, entry))
+    return PrefixIndex(pairs)
+
+
+def get_index():
+    """The process-wide index for the current catalog version."""
+    global _index, _index_version
+    version = get_version()
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = build_index()
+                _index_version = version
+    return _index
+
+
+def autocomplete(query, limit=DEFAULT_LIMIT):
+    prefix = normalize(query)
+    if len(prefix) < MIN_QUERY_LENGTH:
+        return []
+    return get_index().search(prefix, max(1, min(limit, MAX_LIMIT)))
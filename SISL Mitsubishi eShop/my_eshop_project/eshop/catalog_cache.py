@@ -0,0 +1,53 @@
+"""
+Version counters for caching catalog-derived data.
+
+Every cache entry built from the catalog includes the current version in its
+key, so bumping the counter (see eshop/signals.py) orphans all stale entries at
+once instead of deleting them one by one. The counters live in the shared
+cache backend, which lets every worker process see a bump on its next request.
+"""
+import time
+
+from django.core.cache import cache
+
+CATALOG = 'catalog'
+# Moves only when a product's price changes (or products come and go), so the
+# price map served to the discount form outlives unrelated catalog edits.
+PRICES = 'prices'
+
+# Rendered pages and querysets keyed by version can live for a long time,
+# they are never served once the version moves on.
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _version_key(name):
+    return f"eshop:version:{name}"
+
+
+def get_version(name=CATALOG):
+    """
+    Returns the current value of the named version counter.
+    A missing counter (cold cache or eviction) is seeded from the clock so it
+    can never fall back to a value that older cache entries were built with.
+    """
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name=CATALOG):
+    """Moves the named version counter forward, invalidating its cache entries."""
+    key = _version_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        get_version(name)
+        return cache.incr(key)
+
+
+def versioned_key(*parts, name=CATALOG):
+    """Builds a cache key that is only valid for the current version."""
+    return ":".join(["eshop", name, str(get_version(name))] + [str(p) for p in parts])
@@ -0,0 +1,114 @@
+"""
+Streaming catalog export as CSV or JSON Lines.
+
+Products are read with a chunked .iterator() over .values_list(), brand and
+category names come through the join, and the related/compatible SKUs of
+each chunk are fetched with one query per relation. Rows are encoded and
+handed to StreamingHttpResponse one at a time, so memory stays flat however
+large the catalog is.
+"""
+import csv
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .fast_serializers import format_datetime, format_decimal
+from .models import Product
+from .renderers import dumps
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Output column -> values_list() column (None for the M2M SKU lists).
+EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('sku', 'sku'),
+    ('name', 'name'),
+    ('brand', 'brand__name'),
+    ('category', 'category__name'),
+    ('original_price', 'original_price'),
+    ('discounted_price', 'discounted_price'),
+    ('country_of_origin', 'country_of_origin'),
+    ('description', 'description'),
+    ('image', 'image'),
+    ('updated_at', 'updated_at'),
+    ('related_products', None),
+    ('compatible_modules', None),
+)
+M2M_COLUMNS = ('related_products', 'compatible_modules')
+# Joins SKUs inside one CSV cell.
+CSV_LIST_SEPARATOR = '|'
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _linked_skus(relation, product_ids):
+    """{product id: [SKUs]} of one M2M relation for a chunk, in one query."""
+    links = {}
+    through = getattr(Product, relation).through
+    rows = (
+        through.objects.filter(from_product_id__in=product_ids)
+        .order_by('from_product_id', 'to_product__sku')
+        .values_list('from_product_id', 'to_product__sku')
+    )
+    for product_id, sku in rows:
+        links.setdefault(product_id, []).append(sku)
+    return links
+
+
+def _flush(chunk):
+    product_ids = [row[0] for row in chunk]
+    links = {relation: _linked_skus(relation, product_ids) for relation in M2M_COLUMNS}
+    for row in chunk:
+        record = dict(zip((name for name, column in EXPORT_COLUMNS if column), row))
+        record['original_price'] = format_decimal(record['original_price'])
+        record['discounted_price'] = format_decimal(record['discounted_price'])
+        record['updated_at'] = format_datetime(record['updated_at'])
+        for relation in M2M_COLUMNS:
+            record[relation] = links[relation].get(record['id'], [])
+        yield record
+
+
+def iter_products(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields one dict per product, keyed by the EXPORT_COLUMNS names."""
+    queryset = Product.objects.all() if queryset is None else queryset
+    columns = [column for _, column in EXPORT_COLUMNS if column]
+    chunk = []
+    for row in queryset.order_by('id').values_list(*columns).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _flush(chunk)
+            chunk = []
+    if chunk:
+        yield from _flush(chunk)
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer."""
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset=None):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for record in iter_products(queryset):
+        for relation in M2M_COLUMNS:
+            record[relation] = CSV_LIST_SEPARATOR.join(record[relation])
+        yield writer.writerow([record[name] for name, _ in EXPORT_COLUMNS])
+
+
+def iter_jsonl(queryset=None):
+    for record in iter_products(queryset):
+        yield dumps(record) + b'\n'
+
+
+def export_response(fmt, queryset=None):
+    """StreamingHttpResponse with the catalog in `fmt` ('csv' or 'jsonl') as a download."""
+    content = iter_csv(queryset) if fmt == 'csv' else iter_jsonl(queryset)
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[fmt])
+    filename = f"catalog-{timezone.now():%Y%m%d-%H%M}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
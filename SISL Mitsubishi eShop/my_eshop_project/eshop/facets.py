@@ -0,0 +1,143 @@
+"""
+Faceted navigation for category pages.
+
+Every product counts towards the facets of its own category and of each
+ancestor: its brand, its price band, and (for strict ancestors) the child
+category it sits under. The counts live in CategoryFacet and are adjusted
+by a delta whenever a product is created, changed or deleted (see
+eshop/signals.py), so rendering the sidebar never needs a GROUP BY over
+products. `manage.py rebuild_facets` recomputes everything from scratch.
+"""
+from collections import Counter
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import Brand, Category, CategoryFacet, Product
+
+# (key, label, lower bound inclusive, upper bound exclusive), prices in BDT.
+PRICE_BANDS = [
+    ('0-10k', 'Under ৳10,000', None, Decimal('10000')),
+    ('10k-50k', '৳10,000 - ৳50,000', Decimal('10000'), Decimal('50000')),
+    ('50k-1l', '৳50,000 - ৳1,00,000', Decimal('50000'), Decimal('100000')),
+    ('1l-5l', '৳1,00,000 - ৳5,00,000', Decimal('100000'), Decimal('500000')),
+    ('5l+', 'Over ৳5,00,000', Decimal('500000'), None),
+]
+_PRICE_BAND_LABELS = {key: label for key, label, _, _ in PRICE_BANDS}
+_PRICE_BAND_ORDER = {key: i for i, (key, _, _, _) in enumerate(PRICE_BANDS)}
+
+
+def price_band(price):
+    for key, _, lower, upper in PRICE_BANDS:
+        if (lower is None or price >= lower) and (upper is None or price < upper):
+            return key
+    return None
+
+
+def price_band_filter(key):
+    """Q for products in the price band `key`, or None for an unknown key."""
+    for band_key, _, lower, upper in PRICE_BANDS:
+        if band_key == key:
+            q = Q()
+            if lower is not None:
+                q &= Q(original_price__gte=lower)
+            if upper is not None:
+                q &= Q(original_price__lt=upper)
+            return q
+    return None
+
+
+def _contributions(path, brand_id, price):
+    """(category_id, facet, value) for every facet count one product adds to."""
+    ancestor_ids = [int(part) for part in path.split('/') if part]
+    band = price_band(price)
+    keys = []
+    for i, category_id in enumerate(ancestor_ids):
+        keys.append((category_id, CategoryFacet.BRAND, str(brand_id)))
+        if band:
+            keys.append((category_id, CategoryFacet.PRICE, band))
+        if i + 1 < len(ancestor_ids):
+            keys.append((category_id, CategoryFacet.CHILD, str(ancestor_ids[i + 1])))
+    return keys
+
+
+def _labels(keys):
+    brand_ids = {int(value) for _, facet, value in keys if facet == CategoryFacet.BRAND}
+    child_ids = {int(value) for _, facet, value in keys if facet == CategoryFacet.CHILD}
+    brands = dict(Brand.objects.filter(pk__in=brand_ids).values_list('pk', 'name')) if brand_ids else {}
+    children = dict(Category.objects.filter(pk__in=child_ids).values_list('pk', 'name')) if child_ids else {}
+
+    def label(facet, value):
+        if facet == CategoryFacet.BRAND:
+            return brands.get(int(value), value)
+        if facet == CategoryFacet.CHILD:
+            return children.get(int(value), value)
+        return _PRICE_BAND_LABELS.get(value, value)
+    return label
+
+
+def product_state(category_id, brand_id, price):
+    """The facet-relevant state of a product, or None if its category is gone."""
+    path = Category.objects.filter(pk=category_id).values_list('path', flat=True).first()
+    if not path:
+        return None
+    return path, brand_id, price
+
+
+def apply_delta(state, delta):
+    """Adds `delta` (+1/-1) to every facet count of a product in `state`."""
+    if state is None:
+        return
+    keys = _contributions(*state)
+    match = reduce(or_, (Q(category_id=c, facet=f, value=v) for c, f, v in keys))
+    with transaction.atomic():
+        rows = CategoryFacet.objects.filter(match)
+        if delta > 0:
+            existing = set(rows.values_list('category_id', 'facet', 'value'))
+            missing = [key for key in keys if key not in existing]
+            if missing:
+                # Created empty and then counted like the others: a concurrent
+                # save may insert the same rows first, and its insert wins.
+                label = _labels(missing)
+                CategoryFacet.objects.bulk_create([
+                    CategoryFacet(category_id=c, facet=f, value=v, label=label(f, v), count=0)
+                    for c, f, v in missing
+                ], ignore_conflicts=True)
+        rows.update(count=F('count') + delta)
+        if delta < 0:
+            CategoryFacet.objects.filter(match, count__lte=0).delete()
+
+
+def rebuild_facets():
+    """Recomputes every facet count from the products. Returns the number of rows written."""
+    counts = Counter()
+    rows = Product.objects.values_list('category__path', 'brand_id', 'original_price')
+    for path, brand_id, price in rows.iterator(chunk_size=2000):
+        if path:
+            counts.update(_contributions(path, brand_id, price))
+    label = _labels(counts.keys())
+    with transaction.atomic():
+        CategoryFacet.objects.all().delete()
+        CategoryFacet.objects.bulk_create(
+            [CategoryFacet(category_id=c, facet=f, value=v, label=label(f, v), count=n)
+             for (c, f, v), n in counts.items()],
+            batch_size=1000,
+        )
+    return len(counts)
+
+
+def sidebar_facets(category):
+    """
+    {facet: [CategoryFacet, ...]} for the category page sidebar, in one query.
+    Counts cover the whole subtree and ignore any filters already applied.
+    """
+    groups = {CategoryFacet.CHILD: [], CategoryFacet.BRAND: [], CategoryFacet.PRICE: []}
+    for row in CategoryFacet.objects.filter(category=category, count__gt=0):
+        groups[row.facet].append(row)
+    groups[CategoryFacet.CHILD].sort(key=lambda row: row.label)
+    groups[CategoryFacet.BRAND].sort(key=lambda row: row.label)
+    groups[CategoryFacet.PRICE].sort(key=lambda row: _PRICE_BAND_ORDER.get(row.value, 0))
+    return groups
@@ -0,0 +1,135 @@
+"""
+Read-only fast path for the product API.
+
+Builds the same dicts as ProductSerializer (nested brand included) straight
+from .values() rows, skipping serializer instantiation and per-field
+to_representation calls. Field order and value formatting follow DRF's
+defaults exactly, so the rendered JSON is byte-for-byte the same; the
+`benchmark_product_api` command checks that against the real serializer.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import Product
+
+# Output order of ProductSerializer (fields='__all__'): pk, declared fields,
+# concrete fields, then relations.
+PRODUCT_FIELDS = (
+    'id', 'brand', 'name', 'original_price', 'sku', 'image', 'image_renditions',
+    'country_of_origin', 'description', 'discounted_price', 'updated_at',
+    'category', 'related_products', 'compatible_modules',
+)
+BRAND_FIELDS = ('id', 'name', 'logo', 'logo_renditions', 'description')
+M2M_FIELDS = ('related_products', 'compatible_modules')
+
+_CENTS = Decimal('0.01')
+
+
+def format_decimal(value):
+    # DRF DecimalField with decimal_places=2 and COERCE_DECIMAL_TO_STRING.
+    if value is None:
+        return None
+    return '{:f}'.format(Decimal(value).quantize(_CENTS, rounding=ROUND_HALF_UP))
+
+
+def format_datetime(value):
+    # DRF DateTimeField with the ISO 8601 format: local time, UTC as "Z".
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _file_url(request, name):
+    if not name:
+        return None
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def _brand(row, request):
+    return {
+        'id': row['brand__id'],
+        'name': row['brand__name'],
+        'logo': _file_url(request, row['brand__logo']),
+        'logo_renditions': row['brand__logo_renditions'],
+        'description': row['brand__description'],
+    }
+
+
+# Output field -> (columns it needs from .values(), row -> value).
+_COLUMNS = {
+    'id': (('id',), lambda row, request: row['id']),
+    'brand': (tuple(f'brand__{name}' for name in BRAND_FIELDS), _brand),
+    'name': (('name',), lambda row, request: row['name']),
+    'original_price': (('original_price',), lambda row, request: format_decimal(row['original_price'])),
+    'sku': (('sku',), lambda row, request: row['sku']),
+    'image': (('image',), lambda row, request: _file_url(request, row['image'])),
+    'image_renditions': (('image_renditions',), lambda row, request: row['image_renditions']),
+    'country_of_origin': (('country_of_origin',), lambda row, request: row['country_of_origin']),
+    'description': (('description',), lambda row, request: row['description']),
+    'discounted_price': (('discounted_price',), lambda row, request: format_decimal(row['discounted_price'])),
+    'updated_at': (('updated_at',), lambda row, request: format_datetime(row['updated_at'])),
+    'category': (('category_id',), lambda row, request: row['category_id']),
+}
+
+
+def select_fields(requested=None):
+    """The output fields for a ?fields= set (None means all), in serializer order."""
+    if not requested:
+        return PRODUCT_FIELDS
+    return tuple(name for name in PRODUCT_FIELDS if name in requested)
+
+
+def product_values(queryset, fields=PRODUCT_FIELDS, extra=()):
+    """
+    `queryset` as a .values() queryset holding the columns for `fields`, plus
+    the `extra` columns. 'id' is always loaded: cursor pagination and the M2M
+    lookup need it.
+    """
+    columns = ['id', *extra]
+    for name in fields:
+        for column in _COLUMNS.get(name, ((),))[0]:
+            if column not in columns:
+                columns.append(column)
+    return queryset.values(*columns)
+
+
+def _m2m_ids(relation, product_ids):
+    """{product id: [linked ids]} for one M2M relation, in a single query."""
+    links = {product_id: [] for product_id in product_ids}
+    through = getattr(Product, relation).through
+    rows = (
+        through.objects.filter(from_product_id__in=product_ids)
+        .order_by('from_product_id', 'to_product_id')
+        .values_list('from_product_id', 'to_product_id')
+    )
+    for from_id, to_id in rows:
+        links[from_id].append(to_id)
+    return links
+
+
+def serialize_products(rows, request=None, fields=PRODUCT_FIELDS):
+    """
+    Dicts equal to ProductSerializer(many=True).data for `rows` from
+    product_values(). Each requested M2M relation costs one query.
+    """
+    rows = list(rows)
+    product_ids = [row['id'] for row in rows]
+    m2m = {relation: _m2m_ids(relation, product_ids) for relation in M2M_FIELDS if relation in fields}
+    data = []
+    for row in rows:
+        item = {}
+        for name in fields:
+            if name in m2m:
+                item[name] = m2m[name][row['id']]
+            else:
+                item[name] = _COLUMNS[name][1](row, request)
+        data.append(item)
+    return data
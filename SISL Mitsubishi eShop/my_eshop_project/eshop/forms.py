@@ -1,8 +1,10 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from django.forms import inlineformset_factory
+from django.urls import reverse
+from django.forms import BaseInlineFormSet, inlineformset_factory
+from django.forms.models import ModelChoiceIterator, ModelChoiceIteratorValue
+from django.utils.functional import cached_property
 from .models import Brand, Product, Quotation, QuotationLine
-import sys
 
 ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/png', 'image/gif']
 
@@ -39,6 +41,61 @@ class ProductForm(forms.ModelForm):
         return image
 
 
+class ProductChoices:
+    """
+    (pk, label, price) rows for a product <select>, loaded with one query on
+    first use. A SharedProductChoicesFormSet hands one instance to all of its
+    forms, so a formset renders every row's dropdown from a single query.
+    """
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    @cached_property
+    def rows(self):
+        return list(self.queryset.values_list('pk', 'name', 'original_price'))
+
+
+class PricedChoiceValue(ModelChoiceIteratorValue):
+    """Option value that also carries the product's price for the widget."""
+    def __init__(self, value, price):
+        super().__init__(value, None)
+        self.price = price
+
+
+class PricedProductChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for pk, label, price in self.field.get_product_choices().rows:
+            yield (PricedChoiceValue(pk, price), label)
+
+    def __len__(self):
+        return len(self.field.get_product_choices().rows) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.get_product_choices().rows)
+
+
+class PricedProductChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField whose choices come from a ProductChoices, shared with the
+    other forms of the formset when there is one (see add_fields() below).
+    """
+    iterator = PricedProductChoiceIterator
+    product_choices = None
+
+    def get_product_choices(self):
+        if self.product_choices is None:
+            self.product_choices = ProductChoices(self.queryset)
+        return self.product_choices
+
+    def __deepcopy__(self, memo):
+        result = super().__deepcopy__(memo)
+        # Every form gets its own copy of the field; the rows are per render, not per class.
+        result.product_choices = None
+        return result
+
+
 class ProductSelectWidget(forms.Select):
     """
     Custom widget to attach `data-price` to <option> for auto-filling
@@ -46,17 +103,51 @@ class ProductSelectWidget(forms.Select):
     """
     def create_option(self, name, value, label, selected, index, subindex=None, attrs=None):
         option = super().create_option(name, value, label, selected, index, subindex=subindex, attrs=attrs)
-        if value not in [None, '']:
-            try:
-                # Retrieve the product so we can attach its original_price
-                product = self.choices.queryset.get(pk=value)
-                option['attrs']['data-price'] = str(product.original_price)
-                sys.stderr.write(f"ProductSelectWidget: Added data-price={product.original_price} for product pk={value}\n")
-            except Exception as e:
-                sys.stderr.write(f"ProductSelectWidget error for product pk={value}: {e}\n")
+        price = getattr(value, 'price', None)
+        if price is not None:
+            option['attrs']['data-price'] = str(price)
         return option
 
 
+class ProductSearchWidget(forms.Widget):
+    """
+    Search box backed by the api_product_search endpoint instead of a <select>
+    of the whole catalog. Only the selected product is looked up to render
+    the row; the hidden input carries its pk and `data-price` for the
+    unit_price auto-fill.
+    """
+    template_name = 'partials/_product_search_widget.html'
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['search_url'] = reverse('api_product_search')
+        context['widget']['selected'] = self.selected_product(context['widget']['value'])
+        return context
+
+    @staticmethod
+    def selected_product(value):
+        if not value:
+            return None
+        try:
+            return Product.objects.filter(pk=value).values('pk', 'name', 'sku', 'original_price').first()
+        except (ValueError, ValidationError):
+            return None
+
+
+class SharedProductChoicesFormSet(BaseInlineFormSet):
+    """Gives every form's PricedProductChoiceField, empty_form included, the same rows."""
+    @cached_property
+    def product_choices(self):
+        # The field's own queryset, so any filtering or ordering on it is kept.
+        return ProductChoices(self.form.base_fields['product'].queryset)
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        for field in form.fields.values():
+            if isinstance(field, PricedProductChoiceField):
+                field.product_choices = self.product_choices
+
+
 class QuotationHeaderForm(forms.ModelForm):
     """
     Header form for Quotation, with Email and Delivery Address as optional fields.
@@ -109,10 +200,11 @@ class QuotationLineForm(forms.ModelForm):
     - discount_percent defaults to 25 (read-only).
     - unit_price is read-only.
     - quantity is editable.
+    - product is picked with a server-side search; validation looks up only the chosen pk.
     """
     product = forms.ModelChoiceField(
         queryset=Product.objects.all(),
-        widget=ProductSelectWidget(attrs={'class': 'form-select product-select'})
+        widget=ProductSearchWidget(attrs={'class': 'form-control product-search-input'})
     )
 
     class Meta:
@@ -0,0 +1,132 @@
+"""
+Typo-tolerant lookup of Mitsubishi part numbers.
+
+Customers write the same model number in many ways ("FRE720 0.4K",
+"FR-E720-0.4K", "fr e720"). Names and SKUs are normalized to upper-case
+alphanumerics and split into character trigrams stored in ProductTrigram,
+so a lookup is one indexed GROUP BY over the query's trigrams instead of a
+Python scan of the catalog.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import Product, ProductSearchKey, ProductTrigram
+
+FuzzyMatch = namedtuple('FuzzyMatch', ['product', 'similarity'])
+
+# Marks the start of a key so "FRE" at the front of a model number outweighs
+# "FRE" in the middle of another one. There is no end marker, so a query that
+# is a prefix of a model number ("fr e720") still matches all of its trigrams.
+_START = '^'
+_NON_ALNUM_RE = re.compile(r'[^0-9A-Z]+')
+
+MIN_SIMILARITY = 0.3
+# How many keys with the most shared trigrams are scored exactly.
+CANDIDATE_LIMIT = 50
+BULK_BATCH_SIZE = 1000
+
+
+def normalize(text):
+    """'fr-e720 0.4k' -> 'FRE72004K'"""
+    return _NON_ALNUM_RE.sub('', (text or '').upper())
+
+
+def trigrams(normalized):
+    padded = _START + normalized
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _product_keys(product):
+    keys = []
+    for value in {normalize(product.name), normalize(product.sku)}:
+        if value:
+            keys.append((value, trigrams(value)))
+    return keys
+
+
+def _create_keys(products):
+    keys, grams = [], []
+    for product in products:
+        for normalized, key_grams in _product_keys(product):
+            keys.append((ProductSearchKey(product_id=product.pk, normalized=normalized,
+                                          gram_count=len(key_grams)), key_grams))
+    created = ProductSearchKey.objects.bulk_create([key for key, _ in keys], batch_size=BULK_BATCH_SIZE)
+    for key, key_grams in zip(created, (g for _, g in keys)):
+        grams.extend((key.pk, gram) for gram in key_grams)
+    # A dozen or more rows per key: plain executemany skips building a model
+    # instance for each, which dominates bulk imports.
+    table = connection.ops.quote_name(ProductTrigram._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(grams), BULK_BATCH_SIZE):
+            cursor.executemany(
+                f"INSERT INTO {table} (key_id, gram) VALUES (%s, %s)", grams[start:start + BULK_BATCH_SIZE],
+            )
+
+
+def index_product(product):
+    """Replaces the product's search keys and trigrams."""
+    with transaction.atomic():
+        ProductSearchKey.objects.filter(product_id=product.pk).delete()
+        _create_keys([product])
+
+
+def index_products(products):
+    """Replaces the keys of many products at once, e.g. after a bulk import."""
+    products = list(products)
+    with transaction.atomic():
+        ProductSearchKey.objects.filter(product_id__in=[product.pk for product in products]).delete()
+        _create_keys(products)
+
+
+def rebuild_index(batch_size=BULK_BATCH_SIZE):
+    """Rebuilds every product's keys. Returns the number of products indexed."""
+    count = 0
+    with transaction.atomic():
+        ProductTrigram.objects.all().delete()
+        ProductSearchKey.objects.all().delete()
+        batch = []
+        for product in Product.objects.only('pk', 'name', 'sku').iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                _create_keys(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            _create_keys(batch)
+            count += len(batch)
+    return count
+
+
+def suggest_products(query, limit=5, min_similarity=MIN_SIMILARITY):
+    """
+    Returns up to `limit` FuzzyMatch(product, similarity) tuples, best first.
+    Similarity is the Dice coefficient between the trigram sets of the query
+    and the closest of the product's name/SKU, from 0 to 1.
+    """
+    query_grams = trigrams(normalize(query))
+    if not query_grams:
+        return []
+
+    candidates = (
+        ProductTrigram.objects.filter(gram__in=query_grams)
+        .values('key', 'key__product_id', 'key__gram_count')
+        .annotate(hits=Count('id'))
+        .order_by('-hits')[:CANDIDATE_LIMIT]
+    )
+    scores = {}
+    for row in candidates:
+        similarity = 2.0 * row['hits'] / (len(query_grams) + row['key__gram_count'])
+        product_id = row['key__product_id']
+        if similarity >= min_similarity and similarity > scores.get(product_id, 0):
+            scores[product_id] = similarity
+
+    best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+    products = Product.objects.in_bulk([product_id for product_id, _ in best])
+    return [
+        FuzzyMatch(products[product_id], round(similarity, 3))
+        for product_id, similarity in best
+        if product_id in products
+    ]
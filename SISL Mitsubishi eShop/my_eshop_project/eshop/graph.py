@@ -0,0 +1,163 @@
+"""
+Compatibility graph over Product.compatible_modules and related_products.
+
+Both M2M through tables are loaded with a single UNION query into forward and
+reverse adjacency lists, which are kept in the shared cache under their own
+version counter (bumped by the m2m_changed receiver in eshop/signals.py) and
+memoized per process, like the autocomplete index. Traversals are then a
+plain BFS in memory, so "everything that fits this CPU, through any number
+of adapters" costs no queries beyond fetching the products shown.
+"""
+import threading
+from collections import deque, namedtuple
+
+from django.core.cache import cache
+from django.db.models import Value
+
+from .catalog_cache import CATALOG_CACHE_TIMEOUT, get_version, versioned_key
+from .models import Product
+
+GRAPH = 'graph'
+
+# Relation names are the M2M field names; reverse=True walks the related_name
+# side (compatible_modules reversed is plc_or_hmi_compatible).
+COMPATIBLE = 'compatible_modules'
+RELATED = 'related_products'
+RELATIONS = (COMPATIBLE, RELATED)
+REVERSE_NAMES = {COMPATIBLE: 'plc_or_hmi_compatible', RELATED: 'linked_products'}
+
+DEFAULT_DEPTH = 3
+MAX_DEPTH = 6
+
+# One product reached by a traversal: hops from the start, and the ids on the
+# way there (start excluded, this product included).
+Reach = namedtuple('Reach', ['product_id', 'depth', 'path'])
+
+
+def _freeze(adjacency):
+    return {
+        relation: {node: tuple(sorted(ids)) for node, ids in nodes.items()}
+        for relation, nodes in adjacency.items()
+    }
+
+
+class CompatibilityGraph:
+    """Adjacency lists per relation, in both directions: {relation: {id: (ids...)}}."""
+
+    def __init__(self, forward, reverse):
+        self.forward = forward
+        self.reverse = reverse
+
+    @classmethod
+    def from_edges(cls, edges):
+        forward = {relation: {} for relation in RELATIONS}
+        reverse = {relation: {} for relation in RELATIONS}
+        for relation, from_id, to_id in edges:
+            forward[relation].setdefault(from_id, []).append(to_id)
+            reverse[relation].setdefault(to_id, []).append(from_id)
+        return cls(_freeze(forward), _freeze(reverse))
+
+    def neighbours(self, product_id, relation=COMPATIBLE, reverse=False):
+        adjacency = self.reverse if reverse else self.forward
+        return adjacency[relation].get(product_id, ())
+
+    def reachable(self, product_id, relation=COMPATIBLE, reverse=False, max_depth=DEFAULT_DEPTH):
+        """
+        Every product reachable from `product_id` in at most `max_depth` hops,
+        as Reach tuples in BFS order (nearest first). Cycles are harmless.
+        """
+        adjacency = (self.reverse if reverse else self.forward)[relation]
+        parents = {product_id: None}
+        found = []
+        queue = deque([(product_id, 0)])
+        while queue:
+            node, depth = queue.popleft()
+            if depth >= max_depth:
+                continue
+            for neighbour in adjacency.get(node, ()):
+                if neighbour in parents:
+                    continue
+                parents[neighbour] = node
+                found.append((neighbour, depth + 1))
+                queue.append((neighbour, depth + 1))
+        return [Reach(node, depth, self._path(parents, node)) for node, depth in found]
+
+    @staticmethod
+    def _path(parents, node):
+        path = []
+        while parents[node] is not None:
+            path.append(node)
+            node = parents[node]
+        return tuple(reversed(path))
+
+
+def load_edges():
+    """(relation, from_id, to_id) for every link of both relations, in one query."""
+    through = {relation: getattr(Product, relation).through for relation in RELATIONS}
+    querysets = [
+        model.objects.annotate(relation=Value(relation)).values_list('relation', 'from_product_id', 'to_product_id')
+        for relation, model in through.items()
+    ]
+    return list(querysets[0].union(*querysets[1:], all=True))
+
+
+_lock = threading.Lock()
+_graph = None
+_graph_version = None
+
+
+def get_graph():
+    """The process-wide graph for the current graph version."""
+    global _graph, _graph_version
+    version = get_version(GRAPH)
+    if _graph is None or _graph_version != version:
+        with _lock:
+            if _graph is None or _graph_version != version:
+                key = versioned_key('edges', name=GRAPH)
+                edges = cache.get(key)
+                if edges is None:
+                    edges = load_edges()
+                    cache.set(key, edges, CATALOG_CACHE_TIMEOUT)
+                _graph = CompatibilityGraph.from_edges(edges)
+                _graph_version = version
+    return _graph
+
+
+def compatibility(product_id, max_depth=DEFAULT_DEPTH, relation=COMPATIBLE):
+    """
+    {'compatible_modules': [Reach...], 'plc_or_hmi_compatible': [Reach...]}
+    (keys follow `relation`): what `product_id` works with, and what works with it.
+    """
+    graph = get_graph()
+    return {
+        relation: graph.reachable(product_id, relation, max_depth=max_depth),
+        REVERSE_NAMES[relation]: graph.reachable(product_id, relation, reverse=True, max_depth=max_depth),
+    }
+
+
+# A Reach with its products loaded: `via` lists the products passed through.
+CompatibleProduct = namedtuple('CompatibleProduct', ['product', 'depth', 'via'])
+
+
+def reachable_ids(reaches):
+    # Every hop on a path is itself reached, so the targets cover the paths too.
+    return {reach.product_id for found in reaches.values() for reach in found}
+
+
+def compatible_products(product_id, max_depth=DEFAULT_DEPTH, relation=COMPATIBLE, queryset=None):
+    """
+    compatibility() with every product fetched in one query, as
+    {name: [CompatibleProduct...]}. `queryset` narrows the columns loaded.
+    """
+    reaches = compatibility(product_id, max_depth, relation)
+    ids = reachable_ids(reaches)
+    products = (queryset if queryset is not None else Product.objects.all()).in_bulk(ids) if ids else {}
+    return {
+        name: [
+            CompatibleProduct(products[reach.product_id], reach.depth,
+                              [products[i] for i in reach.path[:-1] if i in products])
+            for reach in found
+            if reach.product_id in products
+        ]
+        for name, found in reaches.items()
+    }
@@ -0,0 +1,116 @@
+"""
+Upload-time image derivatives (fixed-width thumbnails and WebP variants).
+
+When a Product image, Brand logo or Banner image is saved, resized copies
+are written next to the original under MEDIA_ROOT and described in the
+model's *_renditions JSON field:
+
+    {"source": "products/x.png", "width": 2048, "height": 1502,
+     "variants": [{"name": "products/x-400w.webp", "width": 400,
+                   "height": 293, "format": "webp"}, ...]}
+
+Templates turn that into <picture>/srcset markup with the
+{% responsive_image %} tag (eshop/templatetags/image_tags.py), and
+`manage.py build_image_derivatives` backfills existing media.
+
+This module only touches storage, never the database, so it can run in
+worker processes.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+# Widths cover 8-up grids (200), 4-up cards (400), detail pages and banners.
+DERIVATIVE_WIDTHS = (200, 400, 800, 1600)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+# model label -> image field; the renditions live in "<field>_renditions".
+IMAGE_FIELDS = {
+    'eshop.Product': 'image',
+    'eshop.Brand': 'logo',
+    'eshop.Banner': 'image',
+}
+
+
+def renditions_field(image_field):
+    return f"{image_field}_renditions"
+
+
+def _derivative_name(name, width, ext):
+    stem, _ = os.path.splitext(name)
+    return f"{stem}-{width}w.{ext}"
+
+
+def _save(storage, name, image, fmt, **params):
+    buffer = BytesIO()
+    image.save(buffer, format=fmt, **params)
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_renditions(name, storage=default_storage):
+    """
+    Writes the derivatives of the stored image `name` and returns its
+    renditions dict. Returns {} if the file is missing or not an image.
+    """
+    if not name:
+        return {}
+    try:
+        with storage.open(name, 'rb') as source:
+            original = Image.open(source)
+            original.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        return {}
+
+    has_alpha = original.mode in ('RGBA', 'LA', 'P')
+    original = original.convert('RGBA' if has_alpha else 'RGB')
+    src_width, src_height = original.size
+    # Thumbnails keep PNG for transparent sources, JPEG otherwise.
+    fallback_ext, fallback_fmt = ('png', 'PNG') if has_alpha else ('jpg', 'JPEG')
+
+    variants = []
+    widths = [w for w in DERIVATIVE_WIDTHS if w < src_width] + [src_width]
+    for width in widths:
+        height = max(1, round(src_height * width / src_width))
+        resized = original if width == src_width else original.resize((width, height), Image.LANCZOS)
+        webp_name = _save(storage, _derivative_name(name, width, 'webp'), resized, 'WEBP', quality=WEBP_QUALITY)
+        variants.append({'name': webp_name, 'width': width, 'height': height, 'format': 'webp'})
+        if width != src_width:
+            params = {'optimize': True} if has_alpha else {'quality': JPEG_QUALITY, 'optimize': True}
+            thumb_name = _save(storage, _derivative_name(name, width, fallback_ext), resized, fallback_fmt, **params)
+            variants.append({'name': thumb_name, 'width': width, 'height': height, 'format': fallback_ext})
+    return {'source': name, 'width': src_width, 'height': src_height, 'variants': variants}
+
+
+def needs_renditions(instance, image_field):
+    name = getattr(instance, image_field).name or ''
+    current = getattr(instance, renditions_field(image_field)) or {}
+    return current.get('source', '') != name
+
+
+def refresh_renditions(instance, image_field, force=False):
+    """
+    Rebuilds the instance's derivatives if its image changed since they were
+    made. Stores them with a queryset update so no save signals fire again.
+    Like Django with replaced originals, old derivative files are left on
+    disk; a cloned product may still point at them.
+    """
+    if not force and not needs_renditions(instance, image_field):
+        return False
+    field_name = renditions_field(image_field)
+    name = getattr(instance, image_field).name or ''
+    # An unreadable file is recorded as-is so it is not retried on every save.
+    renditions = build_renditions(name) or {'source': name}
+    setattr(instance, field_name, renditions)
+    updates = {field_name: renditions}
+    if hasattr(instance, 'updated_at'):
+        # Cached product pages are keyed by updated_at; make them pick up the srcset.
+        updates['updated_at'] = instance.updated_at = timezone.now()
+    type(instance).objects.filter(pk=instance.pk).update(**updates)
+    return True
@@ -0,0 +1,349 @@
+"""
+Bulk catalog import from CSV or XLSX price lists.
+
+Rows are matched to products by SKU. New products go in with bulk_create and
+changed ones with bulk_update, in batches, inside one transaction; brands and
+categories are resolved by name from dicts loaded once up front. The
+related_products / compatible_modules columns hold "|"-separated SKUs and
+replace the product's links with bulk through-table inserts and deletes.
+
+The column names match eshop/export.py, so an export can be edited and fed
+back in. Only "sku" is required; a missing column leaves that field alone,
+but new products need name, brand, category and original_price. A blank cell
+also leaves a required field alone, while it clears an optional one
+(discounted_price, description, and the link columns).
+
+Bulk writes skip model signals, so import_catalog() refreshes the derived
+data itself: search and part number indexes, facet counts, and the catalog
+and graph cache versions. Image derivatives are left to
+`manage.py build_image_derivatives`.
+"""
+import csv
+import io
+import os
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import facets, fuzzy
+from .catalog_cache import PRICES, bump_version
+from .graph import GRAPH
+from .models import Brand, Category, Product
+from .search import index_products
+
+IMPORT_BATCH_SIZE = 1000
+LIST_SEPARATOR = '|'
+
+# Product fields set straight from a column of the same name.
+TEXT_FIELDS = ('name', 'country_of_origin', 'description', 'image')
+# Blank cells in these columns mean "unchanged" rather than "clear".
+KEEP_IF_BLANK = ('name', 'country_of_origin', 'image', 'original_price')
+PRICE_FIELDS = ('original_price', 'discounted_price')
+M2M_FIELDS = ('related_products', 'compatible_modules')
+REQUIRED_FOR_NEW = ('name', 'brand', 'category', 'original_price')
+
+_CENTS = Decimal('0.01')
+
+
+class CatalogImportError(Exception):
+    """The file as a whole cannot be imported (bad format or headers)."""
+
+
+@dataclass
+class ImportReport:
+    dry_run: bool = False
+    created: list = field(default_factory=list)
+    # sku -> {field: (old, new)}
+    updated: dict = field(default_factory=dict)
+    unchanged: int = 0
+    links_added: int = 0
+    links_removed: int = 0
+    # (line number, sku, message)
+    errors: list = field(default_factory=list)
+    warnings: list = field(default_factory=list)
+
+    def diff_lines(self):
+        for sku in self.created:
+            yield f"+ {sku}"
+        for sku, changes in self.updated.items():
+            for name, (old, new) in changes.items():
+                yield f"~ {sku} {name}: {old!r} -> {new!r}"
+        for line, sku, message in self.errors:
+            yield f"! line {line} {sku or '(no sku)'}: {message}"
+        for message in self.warnings:
+            yield f"? {message}"
+
+    def summary(self):
+        verb = "Would import" if self.dry_run else "Imported"
+        return (
+            f"{verb}: {len(self.created)} new, {len(self.updated)} changed, "
+            f"{self.unchanged} unchanged, {len(self.errors)} rows with errors; "
+            f"links +{self.links_added} -{self.links_removed}."
+        )
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def read_rows(file, filename):
+    """
+    Yields (line number, {column: text}) from a CSV or XLSX upload. Column
+    names are lower-cased; blank lines are skipped.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.xlsx':
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise CatalogImportError("Reading .xlsx files needs the openpyxl package; upload a CSV instead.")
+        sheet = load_workbook(file, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+    elif extension == '.csv':
+        rows = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    else:
+        raise CatalogImportError(f"Unsupported file type '{extension}', expected .csv or .xlsx.")
+
+    header = [_cell(name).lower() for name in next(rows, [])]
+    if 'sku' not in header:
+        raise CatalogImportError("The first row must be a header with at least an 'sku' column.")
+    for line, values in enumerate(rows, start=2):
+        values = [_cell(value) for value in values]
+        if any(values):
+            yield line, dict(zip(header, values))
+
+
+def _parse_price(text):
+    if not text:
+        return None
+    try:
+        return Decimal(text.replace(',', '')).quantize(_CENTS)
+    except InvalidOperation:
+        raise ValueError(f"'{text}' is not a price")
+
+
+def _name_lookup(model):
+    """
+    ({lower-cased name: id}, {id: name}); names used more than once map to
+    None so they are reported instead of guessed.
+    """
+    lookup, names = {}, {}
+    for pk, name in model.objects.values_list('pk', 'name'):
+        key = name.strip().lower()
+        lookup[key] = None if key in lookup else pk
+        names[pk] = name
+    return lookup, names
+
+
+def _resolve(lookup, label, text):
+    key = text.lower()
+    if key not in lookup:
+        raise ValueError(f"unknown {label} '{text}'")
+    if lookup[key] is None:
+        raise ValueError(f"{label} name '{text}' is ambiguous")
+    return lookup[key]
+
+
+def _same(old, new):
+    # Blank and NULL are the same thing in a spreadsheet cell.
+    if old in ('', None) and new in ('', None):
+        return True
+    return old == new
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _existing_products(skus, batch_size):
+    products = {}
+    for chunk in _chunks(skus, batch_size):
+        products.update((product.sku, product) for product in Product.objects.filter(sku__in=chunk))
+    return products
+
+
+def _parse_row(values, brands, categories):
+    """{field: value} for the columns present in `values`."""
+    values = {name: value for name, value in values.items() if value or name not in KEEP_IF_BLANK}
+    parsed = {}
+    for name in TEXT_FIELDS:
+        if name in values:
+            parsed[name] = values[name]
+    for name in PRICE_FIELDS:
+        if name in values:
+            parsed[name] = _parse_price(values[name])
+    if values.get('brand'):
+        parsed['brand_id'] = _resolve(brands, 'brand', values['brand'])
+    if values.get('category'):
+        parsed['category_id'] = _resolve(categories, 'category', values['category'])
+    for name in M2M_FIELDS:
+        if name in values:
+            parsed[name] = [sku.strip() for sku in values[name].split(LIST_SEPARATOR) if sku.strip()]
+    return parsed
+
+
+def _plan(rows, report, batch_size):
+    """
+    Validates every row and works out what changes. Returns (new products,
+    changed products with their changed fields, {sku: {relation: [skus]}}).
+    """
+    rows = list(rows)
+    (brands, brand_names), (categories, category_names) = _name_lookup(Brand), _name_lookup(Category)
+    display = {'brand_id': brand_names.get, 'category_id': category_names.get}
+    existing = _existing_products([values['sku'] for _, values in rows], batch_size)
+    names = {product.name: product.sku for product in existing.values()}
+    file_names = [values['name'] for _, values in rows if values.get('name')]
+    for chunk in _chunks(file_names, batch_size):
+        names.update(Product.objects.filter(name__in=chunk).values_list('name', 'sku'))
+
+    seen = set()
+    new, changed, links = [], {}, {}
+    for line, values in rows:
+        sku = values.get('sku', '')
+        try:
+            if not sku:
+                raise ValueError("missing SKU")
+            if sku in seen:
+                raise ValueError("SKU appears more than once in the file")
+            seen.add(sku)
+            parsed = _parse_row(values, brands, categories)
+            product = existing.get(sku)
+            if product is None:
+                missing = [name for name in REQUIRED_FOR_NEW if not values.get(name)]
+                if missing:
+                    raise ValueError(f"new product needs {', '.join(missing)}")
+            name = parsed.get('name')
+            if name and names.get(name, sku) != sku:
+                raise ValueError(f"model name '{name}' already belongs to SKU {names[name]}")
+        except ValueError as error:
+            report.errors.append((line, sku, str(error)))
+            continue
+
+        if parsed.get('name'):
+            names[parsed['name']] = sku
+        links[sku] = {relation: parsed.pop(relation) for relation in M2M_FIELDS if relation in parsed}
+        if product is None:
+            parsed.setdefault('country_of_origin', '')
+            new.append(Product(sku=sku, **parsed))
+            report.created.append(sku)
+            continue
+        diff = {
+            name: (getattr(product, name), value)
+            for name, value in parsed.items()
+            if not _same(getattr(product, name), value)
+        }
+        if diff:
+            for name, (_, value) in diff.items():
+                setattr(product, name, value)
+            changed[sku] = (product, list(diff))
+            report.updated[sku] = {
+                name.replace('_id', ''): tuple(display.get(name, str)(value) for value in change)
+                for name, change in diff.items()
+            }
+        else:
+            report.unchanged += 1
+    return new, changed, links
+
+
+def _sync_links(links, report, batch_size):
+    """
+    Replaces the links of every imported product whose row had an M2M column.
+    Returns the ids of products whose links changed, on either end.
+    """
+    target_skus = {sku for relations in links.values() for skus in relations.values() for sku in skus}
+    ids = {}
+    for chunk in _chunks(set(links) | target_skus, batch_size):
+        ids.update({sku: pk for pk, sku in Product.objects.filter(sku__in=chunk).values_list('pk', 'sku')})
+    missing = sorted(target_skus - set(ids))
+    if missing:
+        report.warnings.append(f"linked SKUs not in the catalog, skipped: {', '.join(missing)}")
+
+    touched = set()
+    created = set(report.created)
+    for relation in M2M_FIELDS:
+        through = getattr(Product, relation).through
+        wanted = {
+            sku: {ids[target] for target in relations[relation] if target in ids}
+            for sku, relations in links.items()
+            if relation in relations and sku in ids
+        }
+        current = {}
+        for chunk in _chunks([ids[sku] for sku in wanted], batch_size):
+            for pk, from_id, to_id, to_sku in through.objects.filter(from_product_id__in=chunk).values_list(
+                'pk', 'from_product_id', 'to_product_id', 'to_product__sku'
+            ):
+                current.setdefault(from_id, {})[to_id] = (pk, to_sku)
+        to_add, to_remove = [], []
+        for sku, targets in wanted.items():
+            from_id = ids[sku]
+            have = current.get(from_id, {})
+            if targets == set(have):
+                continue
+            to_add.extend(through(from_product_id=from_id, to_product_id=to_id) for to_id in targets - set(have))
+            to_remove.extend(pk for to_id, (pk, _) in have.items() if to_id not in targets)
+            touched.update({from_id} | (targets ^ set(have)))
+            if sku not in created:
+                if sku not in report.updated:
+                    report.unchanged -= 1
+                report.updated.setdefault(sku, {})[relation] = (
+                    LIST_SEPARATOR.join(sorted(to_sku for _, to_sku in have.values())),
+                    LIST_SEPARATOR.join(sorted(links[sku][relation])),
+                )
+        report.links_added += len(to_add)
+        report.links_removed += len(to_remove)
+        for chunk in _chunks(to_remove, batch_size):
+            through.objects.filter(pk__in=chunk).delete()
+        through.objects.bulk_create(to_add, batch_size=batch_size)
+    return touched
+
+
+def import_catalog(rows, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Imports (line, values) rows from read_rows() and returns an ImportReport.
+    Rows with errors are skipped and reported; everything else is written in
+    one transaction. A dry run does the same writes and rolls them back, so
+    its report is exactly what a real import would do.
+    """
+    report = ImportReport(dry_run=dry_run)
+    with transaction.atomic():
+        new, changed, links = _plan(rows, report, batch_size)
+        now = timezone.now()
+        for product in new:
+            product.updated_at = now
+        Product.objects.bulk_create(new, batch_size=batch_size)
+        if changed:
+            update_fields = sorted({name for _, names in changed.values() for name in names})
+            for product, _ in changed.values():
+                product.updated_at = now
+            Product.objects.bulk_update(
+                [product for product, _ in changed.values()], update_fields + ['updated_at'], batch_size=batch_size,
+            )
+        linked = _sync_links(links, report, batch_size)
+        if dry_run:
+            transaction.set_rollback(True)
+            return report
+
+        if linked:
+            # Links show on both products' pages, as in touch_linked_products().
+            for chunk in _chunks(linked, batch_size):
+                Product.objects.filter(pk__in=chunk).update(updated_at=now)
+            transaction.on_commit(lambda: bump_version(GRAPH))
+        written = new + [product for product, _ in changed.values()]
+        if written:
+            for chunk in _chunks(written, batch_size):
+                index_products([product.pk for product in chunk])
+                fuzzy.index_products(chunk)
+            facets.rebuild_facets()
+        if written or linked:
+            transaction.on_commit(bump_version)
+        if new or any('original_price' in names for _, names in changed.values()):
+            transaction.on_commit(lambda: bump_version(PRICES))
+    if any(product.image for product in new) or any('image' in names for _, names in changed.values()):
+        report.warnings.append("images changed; run `manage.py build_image_derivatives` for their thumbnails")
+    return report
@@ -0,0 +1,125 @@
+"""
+Database-backed job queue.
+
+Slow side effects of a request, such as rendering the quotation PDF, are
+queued as Job rows and run by `manage.py run_jobs`, so no broker is needed
+(email has its own outbox, eshop/outbox.py). A worker claims a due job with
+a conditional UPDATE, which only one worker can win even on SQLite, runs the
+handler registered for its name and stores the handler's return value in
+Job.result. A failing job is retried after an exponential backoff until
+max_attempts is used up; a job left RUNNING by a crashed worker is put back
+in the queue after JOB_LOCK_TIMEOUT.
+"""
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+JOB_BACKOFF_BASE = timedelta(seconds=30)
+JOB_BACKOFF_MAX = timedelta(hours=1)
+JOB_LOCK_TIMEOUT = timedelta(minutes=10)
+# Candidates fetched per claim attempt, so workers racing for the head of
+# the queue still find a free job without another query.
+CLAIM_BATCH_SIZE = 10
+
+_handlers = {}
+
+
+class UnknownJob(Exception):
+    pass
+
+
+def job_handler(name):
+    """Registers the decorated function as the handler of jobs called `name`."""
+    def register(func):
+        _handlers[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, quotation=None, delay=None, max_attempts=None):
+    """
+    Adds a job to the queue. Called inside a transaction, the job becomes
+    visible to workers only when that transaction commits.
+    """
+    job = Job(name=name, payload=payload or {}, quotation=quotation)
+    if delay:
+        job.run_after = timezone.now() + delay
+    if max_attempts:
+        job.max_attempts = max_attempts
+    job.save()
+    return job
+
+
+def backoff(attempts):
+    """Delay before retry number `attempts` (1-based): 30s, 1m, 2m, ... capped at an hour."""
+    return min(JOB_BACKOFF_BASE * 2 ** (attempts - 1), JOB_BACKOFF_MAX)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def requeue_stale(now=None):
+    """Puts jobs locked by a worker that died mid-run back in the queue."""
+    now = now or timezone.now()
+    return Job.objects.filter(status=JobStatus.RUNNING, locked_at__lt=now - JOB_LOCK_TIMEOUT).update(
+        status=JobStatus.QUEUED, locked_by='', locked_at=None, run_after=now,
+    )
+
+
+def claim(worker_id, now=None):
+    """Locks and returns the next due job, or None when nothing is due."""
+    now = now or timezone.now()
+    candidates = (
+        Job.objects.filter(status=JobStatus.QUEUED, run_after__lte=now)
+        .order_by('run_after', 'id')
+        .values_list('id', flat=True)[:CLAIM_BATCH_SIZE]
+    )
+    for job_id in candidates:
+        won = Job.objects.filter(id=job_id, status=JobStatus.QUEUED).update(
+            status=JobStatus.RUNNING, locked_by=worker_id, locked_at=now, updated_at=now,
+        )
+        if won:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """Runs a claimed job and records its outcome. Returns True on success."""
+    job.attempts += 1
+    try:
+        handler = _handlers.get(job.name)
+        if handler is None:
+            raise UnknownJob(f"No handler registered for job {job.name!r}.")
+        with transaction.atomic():
+            result = handler(job)
+    except Exception as exc:
+        job.last_error = ''.join(traceback.format_exception_only(type(exc), exc)).strip()
+        if job.attempts >= job.max_attempts or isinstance(exc, UnknownJob):
+            job.status = JobStatus.FAILED
+            logger.exception("Job %s failed for good after %d attempts.", job, job.attempts)
+        else:
+            job.status = JobStatus.QUEUED
+            job.run_after = timezone.now() + backoff(job.attempts)
+            logger.warning("Job %s failed (attempt %d), retrying at %s.", job, job.attempts, job.run_after)
+        succeeded = False
+    else:
+        job.status = JobStatus.DONE
+        job.result = result or {}
+        job.last_error = ''
+        succeeded = True
+    job.locked_by = ''
+    job.locked_at = None
+    job.save(update_fields=['status', 'attempts', 'result', 'last_error', 'run_after',
+                            'locked_by', 'locked_at', 'updated_at'])
+    return succeeded
+
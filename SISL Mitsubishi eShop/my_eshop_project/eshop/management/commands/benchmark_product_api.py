@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from eshop.fast_serializers import product_values, serialize_products
+from eshop.models import Product
+from eshop.renderers import FastJSONRenderer, orjson
+from eshop.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Times ProductSerializer + JSONRenderer against the values() fast path "
+        "+ FastJSONRenderer on one page of products, and checks both produce "
+        "the same bytes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=200, help="Products per page (default: 200).")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per path; the best is reported.")
+        parser.add_argument('--host', default='localhost', help="Host used for absolute image URLs.")
+
+    def handle(self, *args, **options):
+        request = Request(RequestFactory().get('/api/products/', HTTP_HOST=options['host']))
+        limit = options['limit']
+
+        def drf():
+            queryset = (
+                Product.objects.select_related('brand', 'category')
+                .prefetch_related('related_products', 'compatible_modules')
+                .order_by('id')[:limit]
+            )
+            data = ProductSerializer(queryset, many=True, context={'request': request}).data
+            return JSONRenderer().render(data)
+
+        def fast():
+            rows = product_values(Product.objects.order_by('id'))[:limit]
+            return FastJSONRenderer().render(serialize_products(rows, request))
+
+        # Without orjson the fast path still works, on the standard library encoder.
+        self.stdout.write(f"JSON encoder: {'orjson ' + orjson.__version__ if orjson else 'json (orjson not installed)'}")
+        results = {}
+        for label, run in (('ProductSerializer', drf), ('fast path', fast)):
+            timings = []
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    content = run()
+                    timings.append(time.perf_counter() - start)
+            results[label] = content
+            self.stdout.write(
+                f"{label:>18}: {min(timings) * 1000:8.1f} ms, "
+                f"{len(queries) // options['repeat']} queries, {len(content)} bytes"
+            )
+        reset_queries()
+
+        if results['ProductSerializer'] != results['fast path']:
+            raise CommandError("The fast path output differs from ProductSerializer.")
+        self.stdout.write(self.style.SUCCESS("Outputs are byte-for-byte identical."))
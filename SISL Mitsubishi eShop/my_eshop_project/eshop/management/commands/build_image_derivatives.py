@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from eshop.catalog_cache import bump_version
+from eshop.images import IMAGE_FIELDS, build_renditions, needs_renditions, renditions_field
+
+
+def _build(name):
+    # Runs in a worker process: storage and Pillow only, no database access.
+    return name, build_renditions(name)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates thumbnails and WebP variants for existing Product images, "
+        "Brand logos and Banner images, in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Number of worker processes (default: one per CPU).",
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Rebuild derivatives even for images that already have them.",
+        )
+
+    def handle(self, *args, **options):
+        # image name -> [(model, pk, renditions field)]; clones share one file.
+        pending = {}
+        for label, image_field in IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            for obj in model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True}):
+                if options['force'] or needs_renditions(obj, image_field):
+                    name = getattr(obj, image_field).name
+                    pending.setdefault(name, []).append((model, obj.pk, renditions_field(image_field)))
+
+        if not pending:
+            self.stdout.write("All images already have derivatives.")
+            return
+
+        self.stdout.write(f"Building derivatives for {len(pending)} images with {options['workers']} workers...")
+        built = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            futures = [pool.submit(_build, name) for name in pending]
+            for future in as_completed(futures):
+                name, renditions = future.result()
+                if renditions:
+                    built += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f"Could not read {name}")
+                for model, pk, field_name in pending[name]:
+                    updates = {field_name: renditions or {'source': name}}
+                    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+                        # Cached product pages are keyed by updated_at, as in refresh_renditions().
+                        updates['updated_at'] = timezone.now()
+                    model.objects.filter(pk=pk).update(**updates)
+
+        # Queryset updates skip the save signals; let cached pages pick up the srcsets.
+        bump_version()
+        self.stdout.write(self.style.SUCCESS(f"Built derivatives for {built} images, {failed} failed."))
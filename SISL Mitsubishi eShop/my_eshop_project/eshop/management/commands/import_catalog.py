@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from eshop.importer import IMPORT_BATCH_SIZE, CatalogImportError, import_catalog, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports products from a CSV or XLSX price list, upserting by SKU in "
+        "one transaction. Columns follow the catalog export; see eshop/importer.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to a .csv or .xlsx file.")
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Report what would change without writing anything.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help=f"Rows per bulk insert/update (default: {IMPORT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            '--quiet-diff', action='store_true',
+            help="Only print the summary, not the per-product diff.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as file:
+                report = import_catalog(
+                    read_rows(file, options['path']),
+                    dry_run=options['dry_run'],
+                    batch_size=options['batch_size'],
+                )
+        except OSError as error:
+            raise CommandError(f"Cannot read {options['path']}: {error}")
+        except (CatalogImportError, IntegrityError) as error:
+            raise CommandError(f"Nothing was imported: {error}")
+
+        if not options['quiet_diff']:
+            for line in report.diff_lines():
+                self.stdout.write(line)
+        style = self.style.WARNING if report.errors else self.style.SUCCESS
+        self.stdout.write(style(f"{report.summary()} ({time.perf_counter() - started:.1f}s)"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from eshop.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = "Recomputes the precomputed category facet counts from the products."
+
+    def handle(self, *args, **options):
+        count = rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} facet counts."))
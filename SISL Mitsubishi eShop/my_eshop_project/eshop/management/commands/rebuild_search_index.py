@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from eshop import fuzzy
+from eshop.search import INDEX_BATCH_SIZE, fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the full-text product search index and the part number "
+        "trigram index from scratch. Run once after migrating."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=INDEX_BATCH_SIZE,
+            help="Number of products inserted per batch.",
+        )
+
+    def handle(self, *args, **options):
+        if fts_available():
+            count = rebuild_index(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Full-text index: {count} products."))
+        else:
+            self.stderr.write("Full-text search needs SQLite FTS5; skipping the full-text index.")
+        count = fuzzy.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Part number index: {count} products."))
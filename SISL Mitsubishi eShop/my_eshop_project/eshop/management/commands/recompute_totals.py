@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from eshop.models import Quotation
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes Quotation.total_amount from the lines of every quotation "
+        "in a single UPDATE ... SELECT, repairing totals written outside the ORM."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = Quotation.objects.recompute_totals()
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed the totals of {count} quotations ({time.perf_counter() - started:.2f}s)."
+        ))
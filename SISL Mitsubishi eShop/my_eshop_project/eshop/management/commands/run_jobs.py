@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from eshop.jobs import claim, default_worker_id, requeue_stale, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued background jobs (quotation PDFs, see eshop/jobs.py). "
+        "Keeps polling the queue unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Run the jobs that are due, then exit.",
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=2.0,
+            help="Seconds to wait when the queue is empty (default: 2).",
+        )
+        parser.add_argument(
+            '--max-jobs', type=int, default=None,
+            help="Exit after running this many jobs.",
+        )
+        parser.add_argument(
+            '--worker-id', default=None,
+            help="Name recorded on claimed jobs (default: host:pid).",
+        )
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or default_worker_id()
+        max_jobs = options['max_jobs']
+        ran = failed = 0
+        self.stdout.write(f"Worker {worker_id} started.")
+        try:
+            while max_jobs is None or ran < max_jobs:
+                close_old_connections()
+                requeue_stale()
+                job = claim(worker_id)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+                started = time.perf_counter()
+                ok = run_job(job)
+                ran += 1
+                failed += not ok
+                style = self.style.SUCCESS if ok else self.style.WARNING
+                self.stdout.write(style(f"{job} in {time.perf_counter() - started:.2f}s"))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Ran {ran} jobs, {failed} failed.")
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from eshop.outbox import OUTBOX_BATCH_SIZE, drain
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends the emails waiting in the outbox, one SMTP connection per batch "
+        "(see eshop/outbox.py). Keeps polling with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=OUTBOX_BATCH_SIZE,
+            help=f"Emails sent per connection (default: {OUTBOX_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running, polling the outbox every --sleep seconds.",
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=5.0,
+            help="Seconds between polls with --loop (default: 5).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                started = time.perf_counter()
+                sent, failed = drain(options['batch_size'])
+                if sent or failed or not options['loop']:
+                    style = self.style.WARNING if failed else self.style.SUCCESS
+                    self.stdout.write(style(
+                        f"Sent {sent} emails, {failed} failed ({time.perf_counter() - started:.2f}s)."
+                    ))
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
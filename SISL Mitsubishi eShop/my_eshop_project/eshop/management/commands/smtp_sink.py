@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from eshop.smtp_sink import SMTPSink
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a local SMTP server that stores every message as a .eml file instead "
+        "of delivering it. Use with EMAIL_BACKEND smtp, EMAIL_HOST 127.0.0.1, EMAIL_PORT 1025."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+        parser.add_argument(
+            '--directory', default=str(settings.BASE_DIR / 'sent_mail'),
+            help="Where received messages are written (default: BASE_DIR/sent_mail).",
+        )
+
+    def handle(self, *args, **options):
+        sink = SMTPSink((options['host'], options['port']), directory=options['directory'])
+        self.stdout.write(f"SMTP sink on {options['host']}:{sink.server_address[1]}, writing to {options['directory']}")
+        try:
+            sink.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sink.server_close()
+            self.stdout.write(f"Received {len(sink.messages)} messages.")
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:30
+
+from django.db import migrations, models
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model('eshop', 'Category')
+    children = {}
+    for category in Category.objects.all():
+        children.setdefault(category.parent_id, []).append(category)
+
+    stack = [(root, '', 0) for root in children.get(None, [])]
+    while stack:
+        category, parent_path, depth = stack.pop()
+        category.path = f"{parent_path}{category.pk:06d}/"
+        category.depth = depth
+        category.save(update_fields=['path', 'depth'])
+        stack.extend((child, category.path, depth + 1) for child in children.get(category.pk, []))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop', '0013_alter_quotationline_discount_percent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+from django.utils.html import strip_tags
+
+# Mirrors eshop.search.FTS_TABLE; the "-" and "." in Mitsubishi model numbers
+# split tokens, so "FR-E720-0.4K" is searchable as fr e720 0 4k.
+CREATE_FTS_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS eshop_product_fts USING fts5(
+    name, sku, description, brand, category,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Product = apps.get_model('eshop', 'Product')
+    rows = [
+        (pk, name, sku, strip_tags(description or ''), brand or '', category or '')
+        for pk, name, sku, description, brand, category in Product.objects.values_list(
+            'pk', 'name', 'sku', 'description', 'brand__name', 'category__name'
+        )
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(CREATE_FTS_TABLE)
+        cursor.executemany(
+            "INSERT INTO eshop_product_fts (rowid, name, sku, description, brand, category) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS eshop_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop', '0015_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
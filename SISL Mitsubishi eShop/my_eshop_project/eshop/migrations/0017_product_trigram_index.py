@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:34
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Snapshot of eshop.fuzzy's key building at the time of this migration.
+_START = '^'
+_NON_ALNUM_RE = re.compile(r'[^0-9A-Z]+')
+BULK_BATCH_SIZE = 1000
+
+
+def normalize(text):
+    return _NON_ALNUM_RE.sub('', (text or '').upper())
+
+
+def trigrams(normalized):
+    padded = _START + normalized
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def fill_trigram_index(apps, schema_editor):
+    Product = apps.get_model('eshop', 'Product')
+    ProductSearchKey = apps.get_model('eshop', 'ProductSearchKey')
+    ProductTrigram = apps.get_model('eshop', 'ProductTrigram')
+    keys = []
+    for pk, name, sku in Product.objects.values_list('pk', 'name', 'sku').iterator():
+        for value in {normalize(name), normalize(sku)}:
+            if value:
+                key_grams = trigrams(value)
+                keys.append((ProductSearchKey(product_id=pk, normalized=value, gram_count=len(key_grams)), key_grams))
+    created = ProductSearchKey.objects.bulk_create([key for key, _ in keys], batch_size=BULK_BATCH_SIZE)
+    ProductTrigram.objects.bulk_create(
+        [ProductTrigram(key_id=key.pk, gram=gram) for key, (_, key_grams) in zip(created, keys) for gram in key_grams],
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop', '0016_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized', models.CharField(db_index=True, max_length=255)),
+                ('gram_count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_keys', to='eshop.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='eshop.productsearchkey')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['gram', 'key'], name='trigram_gram_key_idx')],
+            },
+        ),
+        migrations.RunPython(fill_trigram_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:39
+
+from collections import Counter
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Snapshot of eshop.facets.PRICE_BANDS at the time of this migration.
+PRICE_BANDS = [
+    ('0-10k', 'Under ৳10,000', None, Decimal('10000')),
+    ('10k-50k', '৳10,000 - ৳50,000', Decimal('10000'), Decimal('50000')),
+    ('50k-1l', '৳50,000 - ৳1,00,000', Decimal('50000'), Decimal('100000')),
+    ('1l-5l', '৳1,00,000 - ৳5,00,000', Decimal('100000'), Decimal('500000')),
+    ('5l+', 'Over ৳5,00,000', Decimal('500000'), None),
+]
+
+
+def count_facets(apps, schema_editor):
+    Brand = apps.get_model('eshop', 'Brand')
+    Category = apps.get_model('eshop', 'Category')
+    CategoryFacet = apps.get_model('eshop', 'CategoryFacet')
+    Product = apps.get_model('eshop', 'Product')
+
+    counts = Counter()
+    for path, brand_id, price in Product.objects.values_list('category__path', 'brand_id', 'original_price'):
+        ancestor_ids = [int(part) for part in (path or '').split('/') if part]
+        band = next(
+            (key for key, _, lower, upper in PRICE_BANDS
+             if (lower is None or price >= lower) and (upper is None or price < upper)),
+            None,
+        )
+        for i, category_id in enumerate(ancestor_ids):
+            counts[(category_id, 'brand', str(brand_id))] += 1
+            if band:
+                counts[(category_id, 'price', band)] += 1
+            if i + 1 < len(ancestor_ids):
+                counts[(category_id, 'child', str(ancestor_ids[i + 1]))] += 1
+
+    labels = {
+        'brand': {str(pk): name for pk, name in Brand.objects.values_list('pk', 'name')},
+        'child': {str(pk): name for pk, name in Category.objects.values_list('pk', 'name')},
+        'price': {key: label for key, label, _, _ in PRICE_BANDS},
+    }
+    CategoryFacet.objects.bulk_create([
+        CategoryFacet(category_id=c, facet=f, value=v, label=labels[f].get(v, v), count=n)
+        for (c, f, v), n in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop', '0019_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('brand', 'Brand'), ('child', 'Sub-category'), ('price', 'Price range')], max_length=10)),
+                ('value', models.CharField(max_length=50)),
+                ('label', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='eshop.category')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'facet', 'value'), name='unique_category_facet_value')],
+            },
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
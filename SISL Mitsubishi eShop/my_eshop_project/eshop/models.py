@@ -1,5 +1,11 @@
-from django.db import models
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Concat, Round, Substr
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Order status choices for managing orders
 class OrderStatus(models.TextChoices):
@@ -9,6 +15,12 @@ class OrderStatus(models.TextChoices):
     DELIVERED = 'D', 'Delivered'
 
 
+# Materialized category path: zero-padded ids of every ancestor and the node
+# itself, each followed by the separator, e.g. "000001/000004/".
+CATEGORY_PATH_SEPARATOR = '/'
+CATEGORY_PATH_STEP = 6
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     parent = models.ForeignKey(
@@ -18,14 +30,75 @@ class Category(models.Model):
         null=True,
         blank=True
     )
+    # Maintained by save(); lets a whole subtree be selected with one index range scan.
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(editable=False, default=0)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Saves the row, then derives path/depth from the parent and rewrites the
+        paths of all descendants if the category moved in the tree.
+        Deleting needs no bookkeeping: the parent FK cascades to the subtree.
+        """
+        parent_path = self.parent.path if self.parent_id else ''
+        # Read by the facet receiver in eshop/signals.py: a moved subtree needs its counts rebuilt.
+        self._moved = bool(self.path) and self.path != self._path_under(parent_path)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._save_path(parent_path)
+
+    def _path_under(self, parent_path):
+        return f"{parent_path}{self.pk:0{CATEGORY_PATH_STEP}d}{CATEGORY_PATH_SEPARATOR}"
+
+    def _save_path(self, parent_path):
+        new_path = self._path_under(parent_path)
+        if new_path == self.path:
+            return
+        old_path = self.path
+        new_depth = parent_path.count(CATEGORY_PATH_SEPARATOR)
+        Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        if old_path:
+            lower, upper = category_subtree_range(old_path)
+            Category.objects.filter(path__gt=lower, path__lt=upper).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_depth - self.depth),
+            )
+        self.path = new_path
+        self.depth = new_depth
+
+    def clean(self):
+        if self.pk and self.parent_id and self.path and self.parent.path.startswith(self.path):
+            raise ValidationError({'parent': "A category cannot be moved under itself or its own sub-category."})
+
+    def subtree_range(self):
+        return category_subtree_range(self.path)
+
+    def ancestor_ids(self):
+        """Ids from the root down to this category, read straight from the path."""
+        return [int(part) for part in self.path.split(CATEGORY_PATH_SEPARATOR) if part]
+
+    def get_breadcrumbs(self):
+        """Root-to-self list of categories, fetched in one query."""
+        return list(Category.objects.filter(pk__in=self.ancestor_ids()).order_by('depth'))
+
+
+def category_subtree_range(path):
+    """
+    (lower, upper) bounds such that lower <= p < upper selects `path` and all of
+    its descendants. The upper bound swaps the trailing separator for the next
+    character, so the range works as a plain index range on any database.
+    """
+    return path, path[:-1] + chr(ord(CATEGORY_PATH_SEPARATOR) + 1)
+
 
 class Banner(models.Model):
     title = models.CharField(max_length=200, blank=True)
     image = models.ImageField(upload_to='banners/', null=True, blank=True)
+    # Thumbnails/WebP variants of `image`, maintained by eshop/images.py.
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.title if self.title else "Banner"
@@ -34,12 +107,51 @@ class Banner(models.Model):
 class Brand(models.Model):
     name = models.CharField(max_length=255)
     logo = models.ImageField(upload_to='brands/logos/', null=True, blank=True)
+    # Thumbnails/WebP variants of `logo`, maintained by eshop/images.py.
+    logo_renditions = models.JSONField(default=dict, blank=True, editable=False)
     description = models.TextField(null=True, blank=True)
 
     def __str__(self):
         return self.name
 
 
+class CategoryFacet(models.Model):
+    """
+    Precomputed number of products in a category subtree that share one facet
+    value (a brand, a child category or a price band). Maintained
+    incrementally by eshop/facets.py so the category sidebar is one query.
+    """
+    BRAND = 'brand'
+    CHILD = 'child'
+    PRICE = 'price'
+    FACET_CHOICES = [
+        (BRAND, 'Brand'),
+        (CHILD, 'Sub-category'),
+        (PRICE, 'Price range'),
+    ]
+
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='facets')
+    facet = models.CharField(max_length=10, choices=FACET_CHOICES)
+    value = models.CharField(max_length=50)
+    label = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'facet', 'value'], name='unique_category_facet_value'),
+        ]
+
+    def __str__(self):
+        return f"{self.category_id} {self.facet}={self.value} ({self.count})"
+
+
+class ProductQuerySet(models.QuerySet):
+    def in_category(self, category):
+        """Products filed under `category` or any of its sub-categories, in one query."""
+        lower, upper = category.subtree_range()
+        return self.filter(category__path__gte=lower, category__path__lt=upper)
+
+
 class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     brand = models.ForeignKey(Brand, on_delete=models.CASCADE)
@@ -47,6 +159,8 @@ class Product(models.Model):
     original_price = models.DecimalField(max_digits=10, decimal_places=2)
     sku = models.CharField(max_length=50, unique=True)
     image = models.ImageField(upload_to='products/')
+    # Thumbnails/WebP variants of `image`, maintained by eshop/images.py.
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     country_of_origin = models.CharField(max_length=100)
 
     description = models.TextField(blank=True, null=True)
@@ -54,6 +168,8 @@ class Product(models.Model):
         max_digits=10, decimal_places=2,
         blank=True, null=True
     )
+    # Also touched by eshop/signals.py when related products or the brand change.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     # Example ManyToMany fields
     related_products = models.ManyToManyField(
@@ -69,10 +185,128 @@ class Product(models.Model):
         related_name='plc_or_hmi_compatible'
     )
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # Composite (sort key, id) indexes backing the keyset orderings in
+        # eshop/pagination.py, globally and within a category. "newest" is
+        # served by the category FK index and the primary key.
+        indexes = [
+            models.Index(fields=['original_price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['category', 'name', 'id'], name='product_cat_name_id_idx'),
+            models.Index(fields=['category', 'original_price', 'id'], name='product_cat_price_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class ProductSearchKey(models.Model):
+    """
+    Normalized model number (name or SKU) of a Product for typo-tolerant
+    part number lookup, see eshop/fuzzy.py. Rebuilt whenever the Product is saved.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_keys')
+    normalized = models.CharField(max_length=255, db_index=True)
+    gram_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.normalized
+
+
+class ProductTrigram(models.Model):
+    key = models.ForeignKey(ProductSearchKey, on_delete=models.CASCADE, related_name='trigrams')
+    gram = models.CharField(max_length=3)
+
+    class Meta:
+        # Covers the gram__in lookup and the per-key hit count in one index scan.
+        indexes = [models.Index(fields=['gram', 'key'], name='trigram_gram_key_idx')]
+
+    def __str__(self):
+        return self.gram
+
+
+class ProductTombstone(models.Model):
+    """
+    Record of a deleted Product, written by eshop/signals.py, so delta sync
+    clients (eshop/sync.py) learn about deletions. The product row itself is
+    still hard-deleted; only its id and SKU are kept here.
+    """
+    product_id = models.PositiveIntegerField(db_index=True)
+    sku = models.CharField(max_length=50)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_id_idx')]
+
+    def __str__(self):
+        return f"{self.sku} (deleted {self.deleted_at:%Y-%m-%d %H:%M})"
+
+
+CENTS = Decimal('0.01')
+
+
+def compute_line_total(quantity, unit_price, discount_percent):
+    """Net line amount, rounded to cents half away from zero like SQL ROUND()."""
+    subtotal = quantity * Decimal(str(unit_price))
+    discount_amount = subtotal * (Decimal(str(discount_percent)) / 100)
+    return (subtotal - discount_amount).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def line_total_expression(prefix=''):
+    """
+    compute_line_total() as a database expression over QuotationLine columns;
+    `prefix` reaches them through a relation, e.g. 'lines__'.
+    """
+    amount = ExpressionWrapper(
+        F(f'{prefix}quantity') * F(f'{prefix}unit_price') * (Value(100) - F(f'{prefix}discount_percent')) / Value(100),
+        output_field=DecimalField(max_digits=16, decimal_places=4),
+    )
+    return Round(amount, 2, output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def _money(expression):
+    # Rounded in SQL too: SQLite does decimal arithmetic in floating point.
+    return Round(expression, 2, output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+class QuotationQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotates each quotation with its line aggregates, computed in the
+        same query: line_count, gross_amount (before discount),
+        discount_amount and net_amount (what total_amount should hold).
+        Quotations without lines get 0 for all four.
+        """
+        zero = Value(Decimal('0'))
+        gross = Coalesce(_money(Sum(F('lines__quantity') * F('lines__unit_price'))), zero,
+                         output_field=DecimalField(max_digits=12, decimal_places=2))
+        net = Coalesce(_money(Sum(line_total_expression('lines__'))), zero,
+                       output_field=DecimalField(max_digits=12, decimal_places=2))
+        return self.annotate(
+            line_count=Count('lines'),
+            gross_amount=gross,
+            net_amount=net,
+        ).annotate(discount_amount=_money(F('gross_amount') - F('net_amount')))
+
+    def recompute_totals(self):
+        """
+        Sets total_amount of every quotation in the queryset from its lines, in
+        a single UPDATE ... SELECT. Returns the number of quotations updated.
+        """
+        lines_total = (
+            QuotationLine.objects.filter(quotation=OuterRef('pk'))
+            .order_by()
+            .values('quotation')
+            .annotate(total=Sum(line_total_expression()))
+            .values('total')
+        )
+        return self.update(total_amount=Coalesce(
+            Subquery(lines_total), Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ))
+
+
 class Quotation(models.Model):
     """
     Quotation model with phone_no, customer_name, email, delivery_address, etc.
@@ -96,16 +330,20 @@ class Quotation(models.Model):
     email = models.EmailField(blank=True, null=True)
     delivery_address = models.TextField(blank=True, null=True)
 
+    objects = QuotationQuerySet.as_manager()
+
     def __str__(self):
         return f"Quotation #{self.pk} for {self.customer or 'Anonymous'}"
 
     def compute_total(self):
         """
-        Sums the line_total of each related QuotationLine,
-        then updates total_amount.
+        Sums the line totals of the related QuotationLines in one aggregate
+        query, then updates total_amount. Line saves and deletes keep the
+        total current on their own (eshop/signals.py); this is the full
+        recompute, see also the recompute_totals command.
         """
-        total = sum(line.line_total() for line in self.lines.all())
-        self.total_amount = total
+        total = self.lines.aggregate(total=Sum(line_total_expression()))['total']
+        self.total_amount = total or Decimal('0')
         self.save(update_fields=['total_amount'])
 
     # Optional helper methods for use in templates
@@ -130,6 +368,19 @@ class Quotation(models.Model):
         return self.delivery_address or "N/A"
 
 
+class QuotationLineQuerySet(models.QuerySet):
+    def with_amounts(self):
+        """
+        Annotates each line with subtotal (quantity x unit price),
+        discount_amount and net_total, equal to line_total() but computed by
+        the database.
+        """
+        return self.annotate(
+            subtotal=_money(F('quantity') * F('unit_price')),
+            net_total=line_total_expression(),
+        ).annotate(discount_amount=_money(F('subtotal') - F('net_total')))
+
+
 class QuotationLine(models.Model):
     """
     Represents one line item in a Quotation.
@@ -145,15 +396,97 @@ class QuotationLine(models.Model):
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     discount_percent = models.DecimalField(max_digits=5, decimal_places=2, default=25)
 
+    objects = QuotationLineQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         if self.product and (not self.unit_price or self.unit_price == 0):
             self.unit_price = self.product.original_price
         super().save(*args, **kwargs)
 
     def line_total(self):
-        subtotal = self.quantity * self.unit_price
-        discount_amount = subtotal * (self.discount_percent / 100)
-        return subtotal - discount_amount
+        return compute_line_total(self.quantity, self.unit_price, self.discount_percent)
 
     def __str__(self):
         return f"Line {self.pk} in Quotation #{self.quotation.pk}"
+
+
+class JobStatus(models.TextChoices):
+    QUEUED = 'queued', 'Queued'
+    RUNNING = 'running', 'Running'
+    DONE = 'done', 'Done'
+    FAILED = 'failed', 'Failed'
+
+
+class Job(models.Model):
+    """
+    Unit of background work (PDF rendering) run by the `run_jobs`
+    worker command; see eshop/jobs.py. `quotation` lets pages find the jobs
+    of a quotation and show their state.
+    """
+    name = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    quotation = models.ForeignKey(
+        Quotation,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        null=True,
+        blank=True
+    )
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(default=dict, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after', 'id'], name='job_status_run_after_idx')]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class OutboxStatus(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    SENDING = 'sending', 'Sending'
+    SENT = 'sent', 'Sent'
+    FAILED = 'failed', 'Failed'
+
+
+class OutboxEmail(models.Model):
+    """
+    Email waiting to be sent by the `send_outbox` command (eshop/outbox.py).
+    Rows are written in the same transaction as the change they announce, so
+    a rolled-back quotation never sends mail and a committed one always does.
+    """
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    # The quotation PDF is attached at send time, from the render cache.
+    quotation = models.ForeignKey(
+        Quotation,
+        on_delete=models.CASCADE,
+        related_name='outbox_emails',
+        null=True,
+        blank=True
+    )
+    attach_quotation_pdf = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=OutboxStatus.choices, default=OutboxStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=8)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at', 'id'], name='outbox_status_next_idx')]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
@@ -0,0 +1,158 @@
+"""
+Transactional email outbox.
+
+Code that wants to send mail calls queue_email() inside its own transaction,
+which only inserts an OutboxEmail row; nothing talks to SMTP during the
+request. The `send_outbox` command drains due rows in batches: each batch
+opens one backend connection (get_connection()), pushes every message over
+it with send_messages(), and closes it, instead of a TCP + TLS + AUTH
+handshake per email. A message that fails is retried with the job queue's
+exponential backoff until its max_attempts are used up; if the server
+cannot be reached at all, the whole batch waits for the next round.
+"""
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .jobs import backoff
+from .models import OutboxEmail, OutboxStatus
+from .pdf import download_name, generate_pdf_file
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 50
+# A batch still SENDING after this long belongs to a sender that died.
+OUTBOX_LOCK_TIMEOUT = timedelta(minutes=10)
+
+
+def queue_email(subject, body, to, from_email=None, quotation=None, attach_quotation_pdf=False):
+    """Adds an email to the outbox; it is sent once the current transaction commits."""
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        to=list(to),
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        quotation=quotation,
+        attach_quotation_pdf=attach_quotation_pdf,
+    )
+
+
+def build_message(row, connection=None):
+    message = EmailMessage(
+        subject=row.subject,
+        body=row.body,
+        from_email=row.from_email,
+        to=row.to,
+        connection=connection,
+    )
+    if row.attach_quotation_pdf and row.quotation_id:
+        pdf_file_path, _ = generate_pdf_file(row.quotation)
+        with open(pdf_file_path, 'rb') as pdf:
+            message.attach(download_name(row.quotation), pdf.read(), 'application/pdf')
+    return message
+
+
+def claim_batch(batch_size=OUTBOX_BATCH_SIZE, now=None):
+    """Marks up to `batch_size` due rows SENDING and returns them, oldest first."""
+    now = now or timezone.now()
+    OutboxEmail.objects.filter(status=OutboxStatus.SENDING, locked_at__lt=now - OUTBOX_LOCK_TIMEOUT).update(
+        status=OutboxStatus.PENDING, locked_at=None,
+    )
+    ids = list(
+        OutboxEmail.objects.filter(status=OutboxStatus.PENDING, next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    # Only rows still PENDING are taken, so two senders never share a row.
+    OutboxEmail.objects.filter(id__in=ids, status=OutboxStatus.PENDING).update(
+        status=OutboxStatus.SENDING, locked_at=now,
+    )
+    return list(
+        OutboxEmail.objects.filter(id__in=ids, status=OutboxStatus.SENDING, locked_at=now)
+        .select_related('quotation').order_by('next_attempt_at', 'id')
+    )
+
+
+def _failed(row, exc):
+    row.attempts += 1
+    row.locked_at = None
+    row.last_error = f"{type(exc).__name__}: {exc}"
+    if row.attempts >= row.max_attempts:
+        row.status = OutboxStatus.FAILED
+        logger.error("Giving up on outbox email %s after %d attempts: %s", row.pk, row.attempts, exc)
+    else:
+        row.status = OutboxStatus.PENDING
+        row.next_attempt_at = timezone.now() + backoff(row.attempts)
+    row.save(update_fields=['attempts', 'locked_at', 'last_error', 'status', 'next_attempt_at'])
+
+
+def _sent(row):
+    row.attempts += 1
+    row.status = OutboxStatus.SENT
+    row.sent_at = timezone.now()
+    row.locked_at = None
+    row.last_error = ''
+    row.save(update_fields=['attempts', 'status', 'sent_at', 'locked_at', 'last_error'])
+
+
+def send_batch(batch_size=OUTBOX_BATCH_SIZE, connection=None):
+    """
+    Sends one batch over a single connection. Returns (sent, failed);
+    (0, 0) means the outbox had nothing due.
+    """
+    rows = claim_batch(batch_size)
+    if not rows:
+        return 0, 0
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        logger.warning("Email backend unavailable, %d outbox emails postponed: %s", len(rows), exc)
+        for row in rows:
+            _failed(row, exc)
+        return 0, len(rows)
+
+    sent = failed = 0
+    try:
+        for row in rows:
+            try:
+                message = build_message(row, connection)
+                connection.send_messages([message])
+            except smtplib.SMTPServerDisconnected as exc:
+                # Reconnect once for the rest of the batch; this row is retried later.
+                _failed(row, exc)
+                failed += 1
+                connection.close()
+                connection.open()
+            except Exception as exc:
+                _failed(row, exc)
+                failed += 1
+            else:
+                _sent(row)
+                sent += 1
+    except Exception as exc:
+        # Reconnecting failed: hand the untouched rows back for the next round.
+        for row in rows:
+            if row.status == OutboxStatus.SENDING:
+                _failed(row, exc)
+                failed += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def drain(batch_size=OUTBOX_BATCH_SIZE, max_batches=None):
+    """Sends batches until nothing is due; returns (sent, failed) totals."""
+    total_sent = total_failed = batches = 0
+    while max_batches is None or batches < max_batches:
+        sent, failed = send_batch(batch_size)
+        if not sent and not failed:
+            break
+        total_sent += sent
+        total_failed += failed
+        batches += 1
+    return total_sent, total_failed
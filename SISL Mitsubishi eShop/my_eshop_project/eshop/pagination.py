@@ -0,0 +1,115 @@
+"""
+Keyset (cursor) pagination for storefront product listings.
+
+Instead of OFFSET, each page continues from the (sort key, id) of the last
+row of the previous page, so with a matching composite index every page is
+a short index range scan no matter how deep the visitor goes.
+"""
+import base64
+import json
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+# ?sort= value -> model field ordering. Every ordering is backed by a
+# composite (field, id) index on Product, see Product.Meta.indexes.
+PRODUCT_ORDERINGS = {
+    'name': 'name',
+    'price': 'original_price',
+    'newest': '-id',
+}
+DEFAULT_PRODUCT_ORDERING = 'name'
+DEFAULT_PAGE_SIZE = 24
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    sort: str
+    next_cursor: str = None
+    cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(v) for v in values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns the list of values in the cursor, or None if it is malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+        return None
+    return values
+
+
+def paginate_keyset(queryset, sort=None, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Returns a KeysetPage of `queryset` ordered by PRODUCT_ORDERINGS[sort], id.
+    An unknown sort falls back to the default; a malformed cursor starts over
+    at the first page.
+    """
+    if sort not in PRODUCT_ORDERINGS:
+        sort = DEFAULT_PRODUCT_ORDERING
+    ordering = PRODUCT_ORDERINGS[sort]
+    descending = ordering.startswith('-')
+    field_name = ordering.lstrip('-')
+    order_by = [ordering] if field_name == 'id' else [ordering, '-id' if descending else 'id']
+
+    after = decode_cursor(cursor)
+    if not after:
+        # Missing or malformed: this is the first page, so it has no cursor.
+        cursor = None
+    else:
+        op = 'lt' if descending else 'gt'
+        try:
+            if field_name == 'id':
+                queryset = queryset.filter(**{f'id__{op}': int(after[-1])})
+            else:
+                value, last_id = after
+                queryset = queryset.filter(
+                    Q(**{f'{field_name}__{op}': value})
+                    | Q(**{field_name: value, f'id__{op}': int(last_id)})
+                )
+        except (ValueError, ValidationError):
+            cursor = None
+
+    rows = list(queryset.order_by(*order_by)[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        if field_name == 'id':
+            next_cursor = encode_cursor([last.pk])
+        else:
+            next_cursor = encode_cursor([getattr(last, field_name), last.pk])
+    return KeysetPage(object_list=rows, sort=sort, next_cursor=next_cursor, cursor=cursor)
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the product API, walking the primary key so every
+    page is an index range scan and rows never shift between pages.
+    """
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,163 @@
+"""
+Quotation PDF rendering service.
+
+HTML is turned into PDF by the engine named in settings.PDF_ENGINE
+('wkhtmltopdf' through pdfkit, or 'weasyprint'), on a bounded pool of
+settings.PDF_RENDER_WORKERS long-lived renderer threads per process, so a
+burst of quotations queues up instead of starting one engine per request.
+
+Every PDF is written once under MEDIA_ROOT/quotations, named after the
+SHA-256 of the engine and the rendered HTML, whose static and media assets
+are already inlined by eshop/pdf_assets.py: rendering an unchanged quotation
+again (a resend, a staff download) is a file lookup, and concurrent requests
+for the same document wait on the one render already in flight.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .models import Quotation
+from .pdf_assets import localize_assets
+
+PDF_SUBDIR = 'quotations'
+# Seconds a caller waits for its render, queueing time included.
+RENDER_TIMEOUT = 120
+# Assets arrive inlined or as file:// URLs (eshop/pdf_assets.py); newer
+# wkhtmltopdf releases refuse file:// unless told otherwise.
+WKHTMLTOPDF_OPTIONS = {'encoding': 'UTF-8', 'quiet': '', 'enable-local-file-access': ''}
+
+
+class PDFRenderError(Exception):
+    pass
+
+
+def _render_wkhtmltopdf(html, binary):
+    import pdfkit
+
+    try:
+        # An empty path makes pdfkit look the binary up on PATH.
+        config = pdfkit.configuration(wkhtmltopdf=binary)
+    except OSError as exc:
+        raise PDFRenderError(f"wkhtmltopdf not found ({binary or 'PATH'}): {exc}") from exc
+    return pdfkit.from_string(html, False, options=WKHTMLTOPDF_OPTIONS, configuration=config)
+
+
+def _render_weasyprint(html, binary):
+    try:
+        from weasyprint import HTML, default_url_fetcher
+    except ImportError as exc:
+        raise PDFRenderError("PDF_ENGINE 'weasyprint' needs the weasyprint package.") from exc
+
+    def local_only(url, *args, **kwargs):
+        if not url.startswith(('data:', 'file:')):
+            raise PDFRenderError(f"Refusing to fetch {url} while rendering a PDF.")
+        return default_url_fetcher(url, *args, **kwargs)
+
+    return HTML(string=html, base_url=str(settings.BASE_DIR), url_fetcher=local_only).write_pdf()
+
+
+ENGINES = {
+    'wkhtmltopdf': _render_wkhtmltopdf,
+    'weasyprint': _render_weasyprint,
+}
+
+
+class PDFRenderer:
+    """Renders HTML to cached PDF files on a fixed-size worker pool."""
+
+    def __init__(self, engine, binary='', workers=2, directory=None):
+        if engine not in ENGINES:
+            raise PDFRenderError(f"Unknown PDF_ENGINE {engine!r}; choose one of {', '.join(ENGINES)}.")
+        self.engine = engine
+        self.binary = binary
+        self.directory = directory or os.path.join(settings.MEDIA_ROOT, PDF_SUBDIR)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pdf-render')
+        self._in_flight = {}
+        self._lock = threading.RLock()
+
+    def cache_key(self, html):
+        digest = hashlib.sha256(f"{self.engine}\0".encode())
+        digest.update(html.encode('utf-8'))
+        return digest.hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def render(self, html):
+        """Path of the PDF for `html`, rendering it only if it is not on disk yet."""
+        key = self.cache_key(html)
+        path = self.path_for(key)
+        if os.path.exists(path):
+            return path
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self.executor.submit(self._render_to_file, html, path)
+                self._in_flight[key] = future
+                future.add_done_callback(lambda done: self._forget(key))
+        return future.result(timeout=RENDER_TIMEOUT)
+
+    def _forget(self, key):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def _render_to_file(self, html, path):
+        if os.path.exists(path):
+            # Another process finished the same document while this one queued.
+            return path
+        pdf = ENGINES[self.engine](html, self.binary)
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary name first so a reader never sees half a file.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(pdf)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer():
+    """The process-wide PDFRenderer built from the PDF_* settings."""
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = PDFRenderer(
+                    engine=getattr(settings, 'PDF_ENGINE', 'wkhtmltopdf'),
+                    binary=getattr(settings, 'PDF_ENGINE_BINARY', ''),
+                    workers=getattr(settings, 'PDF_RENDER_WORKERS', 2),
+                )
+    return _renderer
+
+
+def generate_pdf_file(quotation):
+    """
+    Renders 'quotation_pdf.html' for `quotation` to a PDF under
+    MEDIA_ROOT/quotations and returns (pdf_file_path, pdf_file_name).
+    An unchanged quotation reuses the file from its previous render.
+    """
+    quotation = Quotation.objects.with_totals().get(pk=quotation.pk)
+    html_string = localize_assets(render_to_string('quotation_pdf.html', {
+        'quotation': quotation,
+        'lines': quotation.lines.with_amounts().select_related('product').order_by('pk'),
+    }))
+    file_path = get_renderer().render(html_string)
+    return file_path, os.path.basename(file_path)
+
+
+def download_name(quotation):
+    """Friendly file name for a quotation PDF sent to a person."""
+    return f"quotation_{quotation.order_number or quotation.pk}.pdf"
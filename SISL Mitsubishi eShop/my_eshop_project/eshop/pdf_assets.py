@@ -0,0 +1,188 @@
+"""
+Local asset resolution for HTML handed to the PDF renderer (eshop/pdf.py).
+
+localize_assets() rewrites every static and media reference in the rendered
+HTML before it reaches the engine: stylesheets become inline <style> blocks,
+and images and fonts (in the page or inside that CSS) become data: URIs, or
+file:// URLs when they are too large to inline. The renderer therefore never
+resolves a URL over HTTP, so render time does not depend on the network or
+on the web server being up.
+
+Encoded assets and inlined stylesheets are memoized per process, keyed by
+the file's path, size and mtime: they are computed once per deploy (or per
+edit, in development), not once per PDF. Because the data lands in the HTML,
+a changed asset also changes the PDF's content hash and forces a re-render.
+"""
+import base64
+import logging
+import mimetypes
+import os
+import re
+import threading
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+
+logger = logging.getLogger(__name__)
+
+# Bigger files are referenced as file:// instead of being embedded.
+INLINE_MAX_BYTES = 512 * 1024
+
+_LINK_RE = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+_ATTR_RE = re.compile(r'''\b(rel|href)\s*=\s*(["'])(.*?)\2''', re.IGNORECASE | re.DOTALL)
+_SRC_RE = re.compile(r'''(\bsrc\s*=\s*)(["'])(.*?)\2''', re.IGNORECASE | re.DOTALL)
+_STYLE_ATTR_RE = re.compile(r'''(\bstyle\s*=\s*)(["'])(.*?)\2''', re.IGNORECASE | re.DOTALL)
+_STYLE_BLOCK_RE = re.compile(r'(<style\b[^>]*>)(.*?)(</style>)', re.IGNORECASE | re.DOTALL)
+_CSS_URL_RE = re.compile(r'''url\(\s*(["']?)([^"')]+)\1\s*\)''', re.IGNORECASE)
+_CSS_IMPORT_RE = re.compile(r'''@import\s+(?:url\()?\s*["']?([^"')\s;]+)["']?\s*\)?\s*;''', re.IGNORECASE)
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def _url_path(url):
+    """Path component of a site URL ('/static/x.png', 'http://host/static/x.png')."""
+    parts = urlsplit(url)
+    if parts.scheme and parts.scheme not in ('http', 'https'):
+        return None
+    return unquote(parts.path)
+
+
+def _under(path, prefix):
+    prefix = '/' + prefix.strip('/') + '/'
+    path = '/' + path.lstrip('/')
+    return path[len(prefix):] if path.startswith(prefix) else None
+
+
+def _file_under(root, relative):
+    try:
+        candidate = safe_join(root, relative)
+    except SuspiciousFileOperation:  # ../ escaping the root
+        return None
+    return candidate if os.path.isfile(candidate) else None
+
+
+def resolve_local(url):
+    """Filesystem path behind a STATIC_URL or MEDIA_URL reference, or None."""
+    if not url or url.startswith(('data:', 'file:', '#')):
+        return None
+    path = _url_path(url)
+    if path is None:
+        return None
+    relative = _under(path, settings.STATIC_URL)
+    if relative is not None:
+        # Finders work from the app directories, before or without collectstatic.
+        found = finders.find(relative)
+        if found:
+            return found
+        static_root = getattr(settings, 'STATIC_ROOT', None)
+        return _file_under(static_root, relative) if static_root else None
+    relative = _under(path, settings.MEDIA_URL)
+    if relative is not None:
+        return _file_under(settings.MEDIA_ROOT, relative)
+    return None
+
+
+def _memoized(kind, path, build):
+    stat = os.stat(path)
+    key = (kind, path, stat.st_size, stat.st_mtime_ns)
+    value = _memo.get(key)
+    if value is None:
+        value = build(path)
+        with _memo_lock:
+            _memo[key] = value
+    return value
+
+
+def _encode(path):
+    if os.path.getsize(path) > INLINE_MAX_BYTES:
+        return Path(path).resolve().as_uri()
+    mime = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    with open(path, 'rb') as file:
+        data = base64.b64encode(file.read()).decode('ascii')
+    return f"data:{mime};base64,{data}"
+
+
+def asset_uri(path):
+    """data: URI (or file:// URL for big files) of a local file, memoized."""
+    return _memoized('uri', path, _encode)
+
+
+def _rewrite_css_urls(css, resolve):
+    # Left unquoted so the result also fits inside a quoted style="" attribute;
+    # data: and file:// URIs contain no characters that would need quoting.
+    def replace(match):
+        target = resolve(match.group(2).strip())
+        return f'url({asset_uri(target)})' if target else match.group(0)
+    return _CSS_URL_RE.sub(replace, css)
+
+
+def _css_resolver(css_path):
+    """Resolves url() values relative to the stylesheet's own location."""
+    def resolve(url):
+        local = resolve_local(url)
+        if local or urlsplit(url).scheme or url.startswith(('/', 'data:', '#')):
+            return local
+        candidate = os.path.normpath(os.path.join(os.path.dirname(css_path), unquote(url.split('?')[0].split('#')[0])))
+        return candidate if os.path.isfile(candidate) else None
+    return resolve
+
+
+def _build_stylesheet(path):
+    with open(path, encoding='utf-8') as file:
+        css = file.read()
+    resolve = _css_resolver(path)
+
+    def inline_import(match):
+        target = resolve(match.group(1))
+        return inline_stylesheet(target) if target else match.group(0)
+
+    css = _CSS_IMPORT_RE.sub(inline_import, css)
+    return _rewrite_css_urls(css, resolve)
+
+
+def inline_stylesheet(path):
+    """A local stylesheet's text, @imports inlined and url() assets embedded; memoized."""
+    return _memoized('css', path, _build_stylesheet)
+
+
+def _warn(url):
+    if urlsplit(url).scheme in ('http', 'https') or url.startswith('//'):
+        logger.warning("PDF asset %s is not a local static/media file; the renderer will fetch it.", url)
+
+
+def localize_assets(html):
+    """`html` with its static/media stylesheets, images and fonts made local."""
+    def replace_link(match):
+        tag = match.group(0)
+        attrs = {name.lower(): value for name, _, value in _ATTR_RE.findall(tag)}
+        if 'stylesheet' not in attrs.get('rel', '').lower() or not attrs.get('href'):
+            return tag
+        path = resolve_local(attrs['href'])
+        if path is None:
+            _warn(attrs['href'])
+            return tag
+        return f"<style>\n{inline_stylesheet(path)}</style>"
+
+    def replace_src(match):
+        path = resolve_local(match.group(3))
+        if path is None:
+            _warn(match.group(3))
+            return match.group(0)
+        return f'{match.group(1)}{match.group(2)}{asset_uri(path)}{match.group(2)}'
+
+    def replace_style_block(match):
+        return match.group(1) + _rewrite_css_urls(match.group(2), resolve_local) + match.group(3)
+
+    def replace_style_attr(match):
+        css = _rewrite_css_urls(match.group(3), resolve_local)
+        return f'{match.group(1)}{match.group(2)}{css}{match.group(2)}'
+
+    html = _LINK_RE.sub(replace_link, html)
+    html = _STYLE_BLOCK_RE.sub(replace_style_block, html)
+    html = _SRC_RE.sub(replace_src, html)
+    return _STYLE_ATTR_RE.sub(replace_style_attr, html)
@@ -0,0 +1,51 @@
+"""
+JSON renderer for the high-volume read endpoints.
+
+Uses orjson when it is installed and the standard library otherwise, with
+Decimal handled by the encoder (as its string form, which is what DRF's
+DecimalField emits). The bytes match DRF's JSONRenderer for compact output,
+including its escaping of U+2028/U+2029; indented output falls back to DRF.
+"""
+import datetime
+import json
+import uuid
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    """Compact UTF-8 JSON bytes, as DRF's JSONRenderer would produce them."""
+    if orjson is not None:
+        content = orjson.dumps(data, default=_default)
+    else:
+        content = json.dumps(
+            data, default=_default, ensure_ascii=False, allow_nan=False, separators=(',', ':'),
+        ).encode('utf-8')
+    # Valid JSON but not valid JavaScript; DRF escapes them, so do we.
+    return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -0,0 +1,193 @@
+"""
+Full-text product search backed by an SQLite FTS5 table.
+
+The eshop_product_fts table holds one row per Product (rowid = product id)
+with its name, SKU, description and brand/category names. It is kept in sync
+by the receivers in eshop/signals.py and can be rebuilt from scratch with
+`manage.py rebuild_search_index`. On other database backends search falls
+back to a plain icontains filter.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+from .models import Product
+from .pagination import KeysetPage, DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor, paginate_keyset
+
+FTS_TABLE = 'eshop_product_fts'
+
+# bm25() column weights, in table column order: a hit in the model name or SKU
+# matters far more than one in the description.
+BM25_WEIGHTS = (10.0, 8.0, 1.0, 3.0, 2.0)
+
+RELEVANCE = 'relevance'
+
+# Private-use markers around matched terms; the snippet is HTML-escaped first
+# and the markers are then swapped for <mark> tags.
+_HIGHLIGHT_OPEN = '\ue000'
+_HIGHLIGHT_CLOSE = '\ue001'
+SNIPPET_TOKENS = 16
+INDEX_BATCH_SIZE = 1000
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_expression(query):
+    """
+    Turns free text into an FTS5 MATCH expression: every word becomes a quoted
+    prefix term, so user input can never inject FTS query syntax.
+    Returns '' when the query has no searchable words.
+    """
+    return ' '.join(f'"{term}"*' for term in _TERM_RE.findall(query))
+
+
+def _index_rows(products):
+    for pk, name, sku, description, brand, category in products:
+        yield pk, name, sku, strip_tags(description or ''), brand or '', category or ''
+
+
+def index_products(product_ids):
+    """(Re)indexes the given products."""
+    product_ids = list(product_ids)
+    if not fts_available() or not product_ids:
+        return
+    rows = Product.objects.filter(pk__in=product_ids).values_list(
+        'pk', 'name', 'sku', 'description', 'brand__name', 'category__name'
+    )
+    with connection.cursor() as cursor:
+        remove_products(product_ids, cursor=cursor)
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, sku, description, brand, category) "
+            f"VALUES (%s, %s, %s, %s, %s, %s)",
+            list(_index_rows(rows)),
+        )
+
+
+def remove_products(product_ids, cursor=None):
+    product_ids = list(product_ids)
+    if not fts_available() or not product_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    sql = f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})"
+    if cursor is not None:
+        cursor.execute(sql, product_ids)
+    else:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, product_ids)
+
+
+def rebuild_index(batch_size=INDEX_BATCH_SIZE):
+    """Empties and repopulates the whole index. Returns the number of products indexed."""
+    if not fts_available():
+        return 0
+    rows = Product.objects.order_by('pk').values_list(
+        'pk', 'name', 'sku', 'description', 'brand__name', 'category__name'
+    )
+    count = 0
+    batch = []
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        insert = (
+            f"INSERT INTO {FTS_TABLE} (rowid, name, sku, description, brand, category) "
+            f"VALUES (%s, %s, %s, %s, %s, %s)"
+        )
+        for row in _index_rows(rows.iterator(chunk_size=batch_size)):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                cursor.executemany(insert, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert, batch)
+            count += len(batch)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return count
+
+
+def _ranked_page(match, cursor, page_size):
+    """
+    One page of (product id, score) ordered by BM25 score (lower is better in
+    SQLite), keyset-paginated on (score, rowid) like the other listings.
+    """
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    sql = (
+        f"SELECT rowid, bm25({FTS_TABLE}, {weights}) AS score "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    )
+    params = [match]
+    after = decode_cursor(cursor)
+    if after and len(after) == 2:
+        try:
+            score, last_id = float(after[0]), int(after[1])
+        except ValueError:
+            cursor = None
+        else:
+            sql = f"SELECT rowid, score FROM ({sql}) WHERE score > %s OR (score = %s AND rowid > %s)"
+            params += [score, score, last_id]
+    else:
+        cursor = None
+    sql += " ORDER BY score, rowid LIMIT %s"
+    params.append(page_size + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        ranked = db_cursor.fetchall()
+
+    next_cursor = None
+    if len(ranked) > page_size:
+        ranked = ranked[:page_size]
+        next_cursor = encode_cursor([repr(ranked[-1][1]), ranked[-1][0]])
+    products = Product.objects.in_bulk([pk for pk, _ in ranked])
+    rows = [products[pk] for pk, _ in ranked if pk in products]
+    return KeysetPage(object_list=rows, sort=RELEVANCE, next_cursor=next_cursor, cursor=cursor)
+
+
+def _attach_snippets(match, products):
+    """Sets product.search_snippet to a highlighted HTML excerpt, one query per page."""
+    if not products:
+        return
+    ids = [p.pk for p in products]
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, snippet({FTS_TABLE}, -1, %s, %s, '…', {SNIPPET_TOKENS}) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})",
+            [_HIGHLIGHT_OPEN, _HIGHLIGHT_CLOSE, match] + ids,
+        )
+        snippets = dict(cursor.fetchall())
+    for product in products:
+        snippet = escape(snippets.get(product.pk, ''))
+        product.search_snippet = mark_safe(
+            snippet.replace(_HIGHLIGHT_OPEN, '<mark>').replace(_HIGHLIGHT_CLOSE, '</mark>')
+        )
+
+
+def search_products(query, sort=RELEVANCE, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Returns a KeysetPage of products matching `query`. The default sort is
+    BM25 relevance; any sort from PRODUCT_ORDERINGS orders the same matches
+    with the regular keyset pagination instead.
+    """
+    if not fts_available():
+        products = Product.objects.filter(Q(name__icontains=query) | Q(sku__icontains=query))
+        return paginate_keyset(products, sort=sort, cursor=cursor, page_size=page_size)
+
+    match = build_match_expression(query)
+    if not match:
+        return KeysetPage(object_list=[], sort=sort or RELEVANCE)
+    if sort in (None, '', RELEVANCE):
+        page = _ranked_page(match, cursor, page_size)
+    else:
+        matches = Product.objects.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        )
+        page = paginate_keyset(matches, sort=sort, cursor=cursor, page_size=page_size)
+    _attach_snippets(match, page.object_list)
+    return page
@@ -1,12 +1,31 @@
 from rest_framework import serializers
 from .models import Brand, Product
 
+class SparseFieldsetMixin:
+    """
+    Drops every field not listed in the request's ?fields=a,b,c, so clients can
+    ask for just the columns they need. Unknown names are ignored.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = requested_fields(request) if request else None
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+def requested_fields(request):
+    """The set of names in ?fields=, or None when the parameter is absent."""
+    value = request.query_params.get('fields', '')
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    return names or None
+
 class BrandSerializer(serializers.ModelSerializer):
     class Meta:
         model = Brand
         fields = '__all__'
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     brand = BrandSerializer()  # Nested serializer to include brand details
 
     class Meta:
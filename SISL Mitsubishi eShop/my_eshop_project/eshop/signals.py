@@ -0,0 +1,217 @@
+"""
+Signal receivers that keep caches and derived data in step with the catalog
+and the quotations. Connected in EshopConfig.ready().
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import facets, fuzzy
+from .graph import GRAPH
+from .catalog_cache import PRICES, bump_version
+from .images import IMAGE_FIELDS, refresh_renditions
+from .models import (
+    Banner, Brand, Category, CategoryFacet, Product, ProductTombstone, Quotation, QuotationLine,
+    compute_line_total,
+)
+from .search import index_products, remove_products
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def invalidate_catalog_cache(sender, **kwargs):
+    # Bump after commit so no request can re-cache pre-commit data under the new version.
+    transaction.on_commit(bump_version)
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, **kwargs):
+    index_products([instance.pk])
+    fuzzy.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    remove_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def record_tombstone(sender, instance, **kwargs):
+    # Lets delta sync clients (eshop/sync.py) drop the product too.
+    ProductTombstone.objects.create(product_id=instance.pk, sku=instance.sku)
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def reindex_products_of(sender, instance, created, **kwargs):
+    # Brand and category names are denormalized into the search index.
+    if created:
+        return
+    lookup = 'brand' if sender is Brand else 'category'
+    index_products(Product.objects.filter(**{lookup: instance}).values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Product.related_products.through)
+@receiver(m2m_changed, sender=Product.compatible_modules.through)
+def touch_linked_products(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Links are part of both products' pages and API rows, so bump updated_at on
+    each side. Queryset updates skip post_save, hence the explicit version bump.
+    """
+    if action == 'pre_clear':
+        # pk_set is None for clears, so remember who is about to be unlinked.
+        own, other = ('to_product', 'from_product') if reverse else ('from_product', 'to_product')
+        instance._cleared_link_ids = set(
+            sender.objects.filter(**{own: instance.pk}).values_list(other, flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_link_ids', ())
+    product_ids = {instance.pk} | set(pk_set or ())
+    Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+    transaction.on_commit(bump_version)
+
+
+@receiver(pre_delete, sender=Product)
+def touch_products_linked_to_deleted(sender, instance, **kwargs):
+    """
+    Deleting a product removes its link rows without firing m2m_changed, so
+    touch every product linking to it, in either direction, while the rows
+    still exist.
+    """
+    product_ids = set()
+    for through in (Product.related_products.through, Product.compatible_modules.through):
+        product_ids.update(through.objects.filter(to_product=instance.pk).values_list('from_product', flat=True))
+        product_ids.update(through.objects.filter(from_product=instance.pk).values_list('to_product', flat=True))
+    product_ids.discard(instance.pk)
+    if product_ids:
+        Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Product.related_products.through)
+@receiver(m2m_changed, sender=Product.compatible_modules.through)
+@receiver(post_delete, sender=Product)
+def invalidate_compatibility_graph(sender, action=None, **kwargs):
+    # Deleting a product cascades to its links without firing m2m_changed.
+    if action in (None, 'post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(lambda: bump_version(GRAPH))
+
+
+@receiver(post_save, sender=Brand)
+def touch_brand_products(sender, instance, created, **kwargs):
+    # Product pages and API rows embed the brand.
+    if not created:
+        Product.objects.filter(brand=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Banner)
+def build_image_renditions(sender, instance, **kwargs):
+    refresh_renditions(instance, IMAGE_FIELDS[sender._meta.label])
+
+
+@receiver(pre_save, sender=Product)
+def remember_facet_state(sender, instance, **kwargs):
+    instance._facet_old = None
+    if instance.pk:
+        instance._facet_old = (
+            Product.objects.filter(pk=instance.pk)
+            .values_list('category_id', 'brand_id', 'original_price')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def update_facet_counts(sender, instance, created, **kwargs):
+    new = (instance.category_id, instance.brand_id, Decimal(str(instance.original_price)))
+    old = getattr(instance, '_facet_old', None)
+    if old == new:
+        return
+    if old is not None:
+        facets.apply_delta(facets.product_state(*old), -1)
+    facets.apply_delta(facets.product_state(*new), +1)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_price_map(sender, instance, created=False, **kwargs):
+    # _facet_old is stashed by remember_facet_state() and holds the old price.
+    old = getattr(instance, '_facet_old', None)
+    if kwargs['signal'] is post_delete or old is None or old[2] != Decimal(str(instance.original_price)):
+        transaction.on_commit(lambda: bump_version(PRICES))
+
+
+@receiver(post_delete, sender=Product)
+def remove_facet_counts(sender, instance, **kwargs):
+    facets.apply_delta(
+        facets.product_state(instance.category_id, instance.brand_id, instance.original_price), -1
+    )
+
+
+@receiver(post_save, sender=Brand)
+def relabel_brand_facets(sender, instance, created, **kwargs):
+    if not created:
+        CategoryFacet.objects.filter(facet=CategoryFacet.BRAND, value=str(instance.pk)).update(label=instance.name)
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_facets(sender, instance, created, **kwargs):
+    if getattr(instance, '_moved', False):
+        # Every ancestor on the old and new path changes; rare enough to recount.
+        # Deferred until Category.save() has rewritten the subtree's paths.
+        transaction.on_commit(facets.rebuild_facets)
+    elif not created:
+        CategoryFacet.objects.filter(facet=CategoryFacet.CHILD, value=str(instance.pk)).update(label=instance.name)
+
+
+def _add_to_total(quotation_id, delta):
+    if delta:
+        Quotation.objects.filter(pk=quotation_id).update(total_amount=F('total_amount') + delta)
+
+
+@receiver(pre_save, sender=QuotationLine)
+def remember_line_total(sender, instance, **kwargs):
+    instance._total_old = None
+    if instance.pk:
+        row = (
+            QuotationLine.objects.filter(pk=instance.pk)
+            .values_list('quotation_id', 'quantity', 'unit_price', 'discount_percent')
+            .first()
+        )
+        if row is not None:
+            instance._total_old = (row[0], compute_line_total(*row[1:]))
+
+
+@receiver(post_save, sender=QuotationLine)
+def update_quotation_total(sender, instance, created, **kwargs):
+    # Applied as F() deltas, so concurrent edits of one quotation's lines add up.
+    new_total = instance.line_total()
+    old = getattr(instance, '_total_old', None)
+    if old is None:
+        _add_to_total(instance.quotation_id, new_total)
+    elif old[0] == instance.quotation_id:
+        _add_to_total(instance.quotation_id, new_total - old[1])
+    else:
+        _add_to_total(old[0], -old[1])
+        _add_to_total(instance.quotation_id, new_total)
+
+
+@receiver(post_delete, sender=QuotationLine)
+def subtract_quotation_total(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Quotation):
+        # The quotation itself is being deleted along with its lines.
+        return
+    _add_to_total(instance.quotation_id, -instance.line_total())
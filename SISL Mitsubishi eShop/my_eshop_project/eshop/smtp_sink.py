@@ -0,0 +1,98 @@
+"""
+Minimal local SMTP server that accepts every message and keeps it.
+
+A stand-in for the real mail server in development and tests: point
+EMAIL_BACKEND at Django's SMTP backend with EMAIL_HOST='127.0.0.1' and
+EMAIL_PORT=1025, run `manage.py smtp_sink`, and every email sent (for
+example by `send_outbox`) is stored as a .eml file instead of delivered.
+Tests can start SMTPSink(('127.0.0.1', 0)) in a thread and read
+`sink.messages`. It speaks just enough SMTP for smtplib: no TLS, no AUTH.
+"""
+import os
+import socketserver
+import threading
+from email import message_from_bytes, policy
+
+from django.utils import timezone
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        self.reply("220 eshop smtp_sink ready")
+        with self.server._lock:
+            self.server.connections += 1
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply("250-eshop smtp_sink")
+                self.reply("250 8BITMIME")
+            elif verb == 'HELO':
+                self.reply("250 eshop smtp_sink")
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip(), []
+                self.reply("250 OK")
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip())
+                self.reply("250 OK")
+            elif verb == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.server.store(sender, recipients, self.read_data())
+                self.reply("250 OK: queued")
+                sender, recipients = None, []
+            elif verb in ('RSET', 'NOOP'):
+                if verb == 'RSET':
+                    sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b".\r\n", b".\n"):
+                break
+            # Undo dot-stuffing (RFC 5321, 4.5.2).
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        return b"".join(lines)
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Stores received messages in `messages` and, given `directory`, as .eml files."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, directory=None):
+        super().__init__(address, SMTPHandler)
+        self.directory = directory
+        self.messages = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def store(self, sender, recipients, data):
+        message = message_from_bytes(data, policy=policy.default)
+        with self._lock:
+            self.messages.append(message)
+            count = len(self.messages)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"{timezone.now():%Y%m%d-%H%M%S}-{count:05d}.eml"
+            with open(os.path.join(self.directory, name), 'wb') as file:
+                file.write(data)
+        return message
+
+    def start(self):
+        """Serves from a daemon thread; returns (host, port) actually bound."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.server_address
@@ -0,0 +1,110 @@
+"""
+Delta sync for catalog consumers (mobile app, distributor price feeds).
+
+A client keeps the opaque watermark from its last sync and sends it back;
+it gets the products changed (created or updated, by Product.updated_at)
+and deleted (ProductTombstone) since then, plus the watermark to use next
+time. Both streams are read by keyset on (timestamp, id), so a large backlog
+is drained over several calls while `has_more` is true.
+
+The watermark never moves past now - SYNC_LAG: a transaction can stamp
+updated_at before it commits, so the last few seconds are sent again on the
+next call rather than risk skipping a row that was not yet visible.
+Clients upsert by id, so repeats are harmless.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .fast_serializers import PRODUCT_FIELDS, product_values
+from .models import Product, ProductTombstone
+from .pagination import decode_cursor, encode_cursor
+
+SYNC_LAG = timedelta(seconds=60)
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 2000
+
+_EPOCH = (datetime(1970, 1, 1, tzinfo=dt_timezone.utc), 0)
+
+Changes = namedtuple('Changes', ['changed', 'deleted', 'watermark', 'has_more'])
+
+
+def encode_watermark(changed_key, deleted_key):
+    return encode_cursor([changed_key[0].isoformat(), changed_key[1], deleted_key[0].isoformat(), deleted_key[1]])
+
+
+def decode_watermark(value):
+    """
+    ((updated_at, id), (deleted_at, id)) from a watermark or a plain ISO 8601
+    timestamp. None or '' means "from the beginning"; None is also returned
+    for anything malformed, for the caller to reject.
+    """
+    if not value:
+        return _EPOCH, _EPOCH
+    parts = decode_cursor(value)
+    if parts and len(parts) == 4:
+        try:
+            keys = [(parse_datetime(parts[0]), int(parts[1])), (parse_datetime(parts[2]), int(parts[3]))]
+        except ValueError:
+            return None
+        if all(key[0] is not None and timezone.is_aware(key[0]) for key in keys):
+            return tuple(keys)
+        return None
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        return None
+    if since is None:
+        return None
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, dt_timezone.utc)
+    return (since, 0), (since, 0)
+
+
+def _after(queryset, field, key):
+    return queryset.filter(Q(**{f'{field}__gt': key[0]}) | Q(**{field: key[0], 'id__gt': key[1]}))
+
+
+def _read(queryset, field, key, limit):
+    """Up to `limit` rows after `key`, and whether more follow."""
+    rows = list(_after(queryset, field, key).order_by(field, 'id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, has_more
+
+
+def _next_key(rows, field, key, has_more, horizon):
+    last = (rows[-1][field], rows[-1]['id']) if rows else horizon
+    if has_more:
+        return last
+    # Caught up: stop at the horizon so uncommitted stragglers are picked up next time.
+    return max(key, min(last, horizon))
+
+
+def changes_since(watermark, fields=PRODUCT_FIELDS, limit=DEFAULT_PAGE_SIZE):
+    """
+    Changes(changed, deleted, watermark, has_more) after a decoded
+    `watermark`. `changed` holds product_values() rows for `fields`, ready
+    for serialize_products(); `deleted` holds tombstone dicts.
+    """
+    changed_key, deleted_key = watermark
+    horizon = (timezone.now() - SYNC_LAG, 0)
+
+    changed, more_changed = _read(
+        product_values(Product.objects.all(), fields, extra=['updated_at']), 'updated_at', changed_key, limit,
+    )
+    deleted, more_deleted = _read(
+        ProductTombstone.objects.values('id', 'product_id', 'sku', 'deleted_at'), 'deleted_at', deleted_key, limit,
+    )
+    return Changes(
+        changed=changed,
+        deleted=deleted,
+        watermark=encode_watermark(
+            _next_key(changed, 'updated_at', changed_key, more_changed, horizon),
+            _next_key(deleted, 'deleted_at', deleted_key, more_deleted, horizon),
+        ),
+        has_more=more_changed or more_deleted,
+    )
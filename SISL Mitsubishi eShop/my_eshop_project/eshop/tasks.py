@@ -0,0 +1,44 @@
+"""
+Job handlers, registered with eshop/jobs.py when the app is ready.
+"""
+import os
+
+from django.conf import settings
+
+from .jobs import enqueue, job_handler
+from .models import Quotation
+from .outbox import queue_email
+from .pdf import generate_pdf_file
+
+QUOTATION_DOCUMENTS = 'quotation_documents'
+
+
+def queue_quotation_documents(quotation, product, requested_by):
+    """
+    Queues the PDF and the notification email of a newly submitted discount
+    request. Call it in the quotation's transaction: both rows commit with it.
+    """
+    queue_email(
+        subject=f"Discount request for {product.name}",
+        body=(
+            f"User {requested_by} requested a multi-line discount.\n"
+            f"Quotation ID: {quotation.pk}\n\n"
+            f"Please find the attached PDF for full details."
+        ),
+        to=[settings.DEFAULT_FROM_EMAIL],
+        quotation=quotation,
+        attach_quotation_pdf=True,
+    )
+    return enqueue(QUOTATION_DOCUMENTS, {'quotation_id': quotation.pk}, quotation=quotation)
+
+
+@job_handler(QUOTATION_DOCUMENTS)
+def render_quotation_documents(job):
+    """
+    Renders the quotation PDF. Returns its public URL, which
+    discount_submitted_view links to; the outbox email attaches the same
+    cached file.
+    """
+    quotation = Quotation.objects.get(pk=job.payload['quotation_id'])
+    pdf_file_path, pdf_file_name = generate_pdf_file(quotation)
+    return {'pdf_url': os.path.join(settings.MEDIA_URL, "quotations", pdf_file_name)}
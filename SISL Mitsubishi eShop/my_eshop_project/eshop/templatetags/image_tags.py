@@ -0,0 +1,43 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, renditions, alt='', sizes='100vw', **attrs):
+    """
+    Renders <picture> with a WebP srcset, a thumbnail srcset fallback and
+    explicit width/height from the renditions recorded by eshop/images.py.
+    Falls back to a plain <img> of the original while none exist yet.
+
+    Usage: {% responsive_image product.image product.image_renditions alt=product.name sizes="25vw" class="mb-3" style="..." %}
+    """
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    renditions = renditions or {}
+    variants = renditions.get('variants')
+    if not variants:
+        return format_html('<img src="{}" alt="{}" loading="lazy"{}>', image.url, alt, extra)
+
+    def srcset(formats):
+        return ', '.join(
+            f"{default_storage.url(v['name'])} {v['width']}w"
+            for v in variants if v['format'] in formats
+        )
+
+    webp = srcset({'webp'})
+    fallback = srcset({'jpg', 'png'})
+    # The original is the largest fallback candidate.
+    fallback = ', '.join(filter(None, [fallback, f"{image.url} {renditions['width']}w"]))
+    smallest = min(
+        (v for v in variants if v['format'] != 'webp'),
+        key=lambda v: v['width'],
+        default=None,
+    )
+    src = default_storage.url(smallest['name']) if smallest else image.url
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="lazy"{}></picture>',
+        webp, sizes, src, fallback, sizes, renditions['width'], renditions['height'], alt, extra,
+    )
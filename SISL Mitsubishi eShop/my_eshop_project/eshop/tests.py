@@ -1,3 +1,578 @@
-from django.test import TestCase
+import base64
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import management
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import facets, jobs, outbox, pdf, pdf_assets
+from .models import Brand, Category, CategoryFacet, Job, JobStatus, OutboxEmail, OutboxStatus, Product, Quotation, QuotationLine
+from .pagination import encode_cursor, paginate_keyset
+from .search import search_products
+from .smtp_sink import SMTPSink
+
+
+def make_product(sku, price='100.00', name=None, category=None, brand=None):
+    return Product.objects.create(
+        category=category or Category.objects.get_or_create(name='PLC')[0],
+        brand=brand or Brand.objects.get_or_create(name='Mitsubishi')[0],
+        name=name or sku,
+        sku=sku,
+        original_price=Decimal(price),
+        country_of_origin='Japan',
+    )
+
+
+class QuotationTotalTests(TestCase):
+    """Quotation.total_amount is kept up to date by F() deltas in eshop/signals.py."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = make_product('FR-E720-0.4K', '1234.56')
+
+    def setUp(self):
+        self.quotation = Quotation.objects.create(order_number='Q-1')
+        self.other = Quotation.objects.create(order_number='Q-2')
+
+    def add_line(self, quotation, quantity=1, unit_price='10.00', discount='0'):
+        return QuotationLine.objects.create(
+            quotation=quotation, product=self.product, quantity=quantity,
+            unit_price=Decimal(unit_price), discount_percent=Decimal(discount),
+        )
+
+    def assertTotal(self, quotation, expected):
+        stored = Quotation.objects.get(pk=quotation.pk).total_amount
+        self.assertEqual(stored, Decimal(expected))
+        Quotation.objects.filter(pk=quotation.pk).recompute_totals()
+        self.assertEqual(Quotation.objects.get(pk=quotation.pk).total_amount, stored)
+
+    def test_create_line(self):
+        self.add_line(self.quotation, 3, '19.99', '25')
+        self.add_line(self.quotation, 1, '0.05', '50')
+        # 3 x 19.99 x 0.75 = 44.9775 -> 44.98; 0.05 x 0.5 = 0.025 -> 0.03
+        self.assertTotal(self.quotation, '45.01')
+
+    def test_edit_quantity_and_price(self):
+        line = self.add_line(self.quotation, 2, '100.00', '10')
+        self.add_line(self.quotation, 1, '50.00')
+        line.quantity = 5
+        line.save()
+        self.assertTotal(self.quotation, '500.00')
+        line.unit_price = Decimal('80.00')
+        line.save()
+        self.assertTotal(self.quotation, '410.00')
+
+    def test_move_line_to_another_quotation(self):
+        line = self.add_line(self.quotation, 2, '30.00')
+        self.add_line(self.quotation, 1, '5.00')
+        self.add_line(self.other, 1, '7.00')
+        line.quotation = self.other
+        line.save()
+        self.assertTotal(self.quotation, '5.00')
+        self.assertTotal(self.other, '67.00')
+
+    def test_delete_line(self):
+        line = self.add_line(self.quotation, 2, '30.00', '12.5')
+        self.add_line(self.quotation, 1, '5.00')
+        line.delete()
+        self.assertTotal(self.quotation, '5.00')
+
+    def test_delete_quotation(self):
+        self.add_line(self.quotation, 2, '30.00')
+        self.add_line(self.quotation, 1, '5.00')
+        self.add_line(self.other, 1, '7.00')
+        with CaptureQueriesContext(connection) as queries:
+            self.quotation.delete()
+        self.assertFalse(QuotationLine.objects.filter(quotation_id=self.quotation.pk).exists())
+        # The cascaded lines must not each update the quotation being deleted.
+        table = Quotation._meta.db_table
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith(f'UPDATE "{table}"')])
+        self.assertTotal(self.other, '7.00')
+
+
+
+class QuotationReportTests(TestCase):
+    """Pages rendered from with_totals()/with_amounts() annotations."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='x', is_staff=True)
+        cls.quotation = Quotation.objects.create(order_number='Q-7')
+        QuotationLine.objects.create(
+            quotation=cls.quotation, product=make_product('Q03UDECPU'), quantity=3,
+            unit_price=Decimal('33.35'), discount_percent=Decimal('25'),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_amounts_are_shown_in_cents(self):
+        # 3 x 33.35 = 100.05, less 25% = 75.0375 -> 75.04
+        for url in (reverse('quotation_detail', args=[self.quotation.pk]), reverse('order_management')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, '<td>1</td>' if 'order' in url else 'Lines: 1')
+                for amount in ('100.05', '25.01', '75.04'):
+                    self.assertContains(response, amount)
+                self.assertNotRegex(response.content.decode(), r'\d\.\d{3,}')
+
+
+
+class ProductBatchLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [make_product(sku) for sku in ('FX5U-32MR/ES', 'GT2107-WTBD', 'FR-E720-0.4K')]
+
+    def post(self, data):
+        return self.client.post(reverse('api_product_batch'), data, content_type='application/json')
+
+    def test_results_follow_request_order(self):
+        response = self.post({'skus': ['FR-E720-0.4K', 'NOPE', 'FX5U-32MR/ES', 'FR-E720-0.4K'], 'fields': 'sku'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['sku'] for row in response.json()['results']], ['FR-E720-0.4K', 'FX5U-32MR/ES'])
+        self.assertEqual(response.json()['not_found'], ['NOPE'])
+
+    def test_malformed_bodies_are_rejected(self):
+        bodies = [
+            ['skus'], 'skus', 42,
+            {'skus': 'FX5U-32MR/ES'}, {'skus': [{'sku': 'FX5U-32MR/ES'}]}, {'skus': [['FX5U-32MR/ES']]},
+            {'ids': ['one']}, {'ids': [None]}, {},
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        self.assertIn('string', str(self.post({'skus': [1]}).json()['skus']))
+
+
+
+class FacetCountTests(TestCase):
+    """CategoryFacet rows kept by eshop/facets.py must match a full rebuild."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Category.objects.create(name='Automation')
+        cls.plc = Category.objects.create(name='PLC', parent=cls.root)
+        cls.hmi = Category.objects.create(name='HMI', parent=cls.root)
+
+    def counts(self):
+        return sorted(CategoryFacet.objects.filter(count__gt=0).values_list('category_id', 'facet', 'value', 'count'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.counts()
+        facets.rebuild_facets()
+        self.assertEqual(incremental, self.counts())
+
+    def test_product_changes(self):
+        product = make_product('FX5U-32MR/ES', '12000.00', category=self.plc)
+        make_product('GT2107-WTBD', '60000.00', category=self.hmi)
+        self.assertMatchesRebuild()
+        product.category = self.hmi
+        product.original_price = Decimal('600000.00')
+        product.save()
+        self.assertMatchesRebuild()
+        product.delete()
+        self.assertMatchesRebuild()
+
+    def test_rows_created_concurrently_are_counted(self):
+        make_product('FX5U-32MR/ES', '12000.00', category=self.plc)
+        state = facets.product_state(self.hmi.pk, Brand.objects.get().pk, Decimal('60000.00'))
+        real_labels = facets._labels
+
+        def labels_after_other_writer(keys):
+            # Another save inserts the same missing rows between our read and insert.
+            CategoryFacet.objects.bulk_create([
+                CategoryFacet(category_id=c, facet=f, value=v, label=v, count=1) for c, f, v in keys
+            ])
+            return real_labels(keys)
+
+        with mock.patch.object(facets, '_labels', labels_after_other_writer):
+            facets.apply_delta(state, +1)
+        brand_rows = CategoryFacet.objects.filter(category=self.hmi, facet=CategoryFacet.BRAND)
+        self.assertEqual(brand_rows.get().count, 2)
+
+
+
+class JobQueueTests(TestCase):
+    """The database job queue in eshop/jobs.py."""
+
+    def setUp(self):
+        self.calls = []
+
+        def record(job):
+            self.calls.append(job.pk)
+            return {'ok': True}
+
+        def explode(job):
+            raise RuntimeError("engine crashed")
+
+        handlers = mock.patch.dict(jobs._handlers, {'record': record, 'explode': explode})
+        handlers.start()
+        self.addCleanup(handlers.stop)
+
+    def test_backoff_doubles_up_to_an_hour(self):
+        self.assertEqual(
+            [jobs.backoff(n) for n in (1, 2, 3, 8, 20)],
+            [timedelta(seconds=30), timedelta(minutes=1), timedelta(minutes=2), timedelta(hours=1), timedelta(hours=1)],
+        )
+
+    def test_claim_takes_each_due_job_once(self):
+        first = jobs.enqueue('record')
+        second = jobs.enqueue('record')
+        jobs.enqueue('record', delay=timedelta(minutes=5))
+        claimed = [jobs.claim('w1'), jobs.claim('w2'), jobs.claim('w3')]
+        self.assertEqual([job and job.pk for job in claimed], [first.pk, second.pk, None])
+        self.assertEqual((claimed[0].status, claimed[0].locked_by), (JobStatus.RUNNING, 'w1'))
+        # The conditional UPDATE only matches QUEUED rows, so a job already
+        # taken by another worker cannot be won again.
+        self.assertEqual(Job.objects.filter(pk=first.pk, status=JobStatus.QUEUED).update(locked_by='w2'), 0)
+
+    def test_success_stores_result(self):
+        job = jobs.enqueue('record')
+        self.assertTrue(jobs.run_job(jobs.claim('w1')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result, job.locked_by), (JobStatus.DONE, 1, {'ok': True}, ''))
+        self.assertEqual(self.calls, [job.pk])
+
+    def test_failure_is_retried_after_backoff(self):
+        job = jobs.enqueue('explode')
+        before = timezone.now()
+        with self.assertLogs('eshop.jobs', 'WARNING'):
+            self.assertFalse(jobs.run_job(jobs.claim('w1')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), (JobStatus.QUEUED, 1, ''))
+        self.assertIn('engine crashed', job.last_error)
+        self.assertGreaterEqual(job.run_after, before + jobs.backoff(1))
+        self.assertIsNone(jobs.claim('w1'))
+        self.assertEqual(jobs.claim('w1', now=job.run_after).pk, job.pk)
+
+    def test_failed_after_max_attempts(self):
+        job = jobs.enqueue('explode', max_attempts=2)
+        with self.assertLogs('eshop.jobs', 'WARNING'):
+            for _ in range(2):
+                due = Job.objects.get(pk=job.pk).run_after
+                jobs.run_job(jobs.claim('w1', now=due))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.FAILED, 2))
+        self.assertIsNone(jobs.claim('w1', now=timezone.now() + timedelta(days=1)))
+
+    def test_unknown_job_fails_at_once(self):
+        job = jobs.enqueue('no-such-job')
+        with self.assertLogs('eshop.jobs', 'ERROR'):
+            jobs.run_job(jobs.claim('w1'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.FAILED, 1))
+
+    def test_stale_running_job_is_requeued(self):
+        stale = jobs.enqueue('record')
+        fresh = jobs.enqueue('record')
+        jobs.claim('dead-worker')
+        jobs.claim('live-worker')
+        Job.objects.filter(pk=stale.pk).update(locked_at=timezone.now() - jobs.JOB_LOCK_TIMEOUT - timedelta(minutes=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.locked_by), (JobStatus.QUEUED, ''))
+        self.assertEqual((fresh.status, fresh.locked_by), (JobStatus.RUNNING, 'live-worker'))
+
+    def test_run_jobs_once(self):
+        jobs.enqueue('record')
+        jobs.enqueue('explode')
+        jobs.enqueue('record', delay=timedelta(minutes=5))
+        out = StringIO()
+        with self.assertLogs('eshop.jobs', 'WARNING'):
+            management.call_command('run_jobs', '--once', '--worker-id', 'test', stdout=out)
+        self.assertIn("Ran 2 jobs, 1 failed.", out.getvalue())
+        self.assertEqual(len(self.calls), 1)
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def fake_pdf(html, binary):
+    return b'%PDF-1.4 ' + html.encode()[:64]
+
+
+def use_stand_in_pdf_engine(test, engine=fake_pdf, workers=2):
+    """
+    No PDF engine binary is assumed in tests: installs a PDFRenderer with a
+    stand-in engine and its own cache directory for the test's duration.
+    Template rendering, asset inlining and caching still run for real.
+    """
+    directory = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directory)
+    engines = mock.patch.dict(pdf.ENGINES, {'test': engine})
+    engines.start()
+    test.addCleanup(engines.stop)
+    renderer = pdf.PDFRenderer('test', workers=workers, directory=directory)
+    test.addCleanup(renderer.executor.shutdown)
+    patch = mock.patch.object(pdf, '_renderer', renderer)
+    patch.start()
+    test.addCleanup(patch.stop)
+    return renderer
+
+
+class PDFRendererTests(TestCase):
+    def test_concurrent_requests_share_one_render(self):
+        started, release, calls = threading.Event(), threading.Event(), []
+
+        def slow_engine(html, binary):
+            calls.append(html)
+            started.set()
+            release.wait(5)
+            return fake_pdf(html, binary)
+
+        renderer = use_stand_in_pdf_engine(self, slow_engine)
+        with ThreadPoolExecutor(max_workers=6) as callers:
+            futures = [callers.submit(renderer.render, '<p>Q-1</p>') for _ in range(6)]
+            self.assertTrue(started.wait(5))
+            release.set()
+            paths = {future.result() for future in futures}
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(paths), 1)
+        # Rendered once, then served from disk.
+        self.assertEqual(renderer.render('<p>Q-1</p>'), paths.pop())
+        self.assertEqual(len(calls), 1)
+
+    def test_pool_bounds_concurrent_renders(self):
+        lock, running, peak = threading.Lock(), [0], [0]
+
+        def counting_engine(html, binary):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return fake_pdf(html, binary)
+
+        renderer = use_stand_in_pdf_engine(self, counting_engine, workers=2)
+        with ThreadPoolExecutor(max_workers=6) as callers:
+            paths = set(callers.map(renderer.render, [f'<p>Q-{i}</p>' for i in range(6)]))
+        self.assertEqual(len(paths), 6)
+        self.assertEqual(peak[0], 2)
+
+    def test_unchanged_quotation_reuses_its_pdf(self):
+        calls = []
+        use_stand_in_pdf_engine(self, lambda html, binary: calls.append(html) or fake_pdf(html, binary))
+        quotation = Quotation.objects.create(order_number='Q-9')
+        line = QuotationLine.objects.create(quotation=quotation, product=make_product('Q03UDECPU'), quantity=1)
+        path, name = pdf.generate_pdf_file(quotation)
+        self.assertEqual(pdf.generate_pdf_file(quotation), (path, name))
+        self.assertEqual(len(calls), 1)
+        line.quantity = 2
+        line.save()
+        self.assertNotEqual(pdf.generate_pdf_file(quotation)[0], path)
+        self.assertEqual(len(calls), 2)
+
+
+
+
+class LocalizeAssetsTests(TestCase):
+    """eshop/pdf_assets.py: nothing in the PDF HTML may point at the web server."""
+
+    PNG = base64.b64decode(
+        'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8DwHwAFBQIAX8jx0gAAAABJRU5ErkJggg=='
+    )
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.static_dir = os.path.join(root, 'static')
+        self.media_dir = os.path.join(root, 'media')
+        self.write('static/img/logo.png', self.PNG)
+        self.write('static/css/base.css', b'.note { color: red; }\n')
+        self.write('static/css/pdf.css', b'@import "base.css";\n.logo { background: url("../img/logo.png"); }\n')
+        self.write('media/products/photo.png', self.PNG)
+        settings = override_settings(
+            STATICFILES_DIRS=[self.static_dir], STATIC_URL='/static/', MEDIA_ROOT=self.media_dir, MEDIA_URL='/media/',
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.png_uri = 'data:image/png;base64,' + base64.b64encode(self.PNG).decode()
+
+    def write(self, relative, data):
+        path = os.path.join(self.static_dir if relative.startswith('static/') else self.media_dir,
+                            relative.split('/', 1)[1])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def test_stylesheets_are_inlined_with_their_imports_and_urls(self):
+        html = pdf_assets.localize_assets('<link rel="stylesheet" href="/static/css/pdf.css">')
+        self.assertNotIn('<link', html)
+        self.assertIn('.note { color: red; }', html)
+        self.assertIn(f'url({self.png_uri})', html)
+
+    def test_images_become_data_uris(self):
+        html = pdf_assets.localize_assets(
+            '<img src="/static/img/logo.png"><img src="http://shop.example/media/products/photo.png">'
+            '<div style="background: url(\'/media/products/photo.png\')"></div>'
+        )
+        self.assertEqual(html.count(self.png_uri), 3)
+
+    def test_large_files_are_referenced_as_file_urls(self):
+        path = self.write('media/products/big.png', self.PNG * 4)
+        with mock.patch.object(pdf_assets, 'INLINE_MAX_BYTES', len(self.PNG)):
+            html = pdf_assets.localize_assets('<img src="/media/products/big.png">')
+        self.assertIn(f'src="file://{os.path.realpath(path)}"', html)
+
+    def test_other_references_are_left_alone(self):
+        html = '<img src="/media/../secrets.png"><img src="data:image/gif;base64,R0lG"><img src="/static/missing.png">'
+        self.assertEqual(pdf_assets.localize_assets(html), html)
+        remote = '<link rel="stylesheet" href="https://cdn.example/bootstrap.css">'
+        with self.assertLogs('eshop.pdf_assets', 'WARNING'):
+            self.assertEqual(pdf_assets.localize_assets(remote), remote)
+
+    def test_changed_asset_is_picked_up(self):
+        html = '<link rel="stylesheet" href="/static/css/base.css">'
+        self.assertIn('color: red', pdf_assets.localize_assets(html))
+        path = self.write('static/css/base.css', b'.note { color: blue; }\n')
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIn('color: blue', pdf_assets.localize_assets(html))
+class OutboxDeliveryTests(TestCase):
+    """outbox.drain() against the local SMTP sink (eshop/smtp_sink.py)."""
+
+    def setUp(self):
+        self.sink = SMTPSink(('127.0.0.1', 0))
+        self.host, self.port = self.sink.start()
+        self.addCleanup(self.sink.server_close)
+        self.addCleanup(self.sink.shutdown)
+
+        use_stand_in_pdf_engine(self)
+
+        self.quotation = Quotation.objects.create(order_number='Q-100')
+        QuotationLine.objects.create(
+            quotation=self.quotation, product=make_product('FX5U-32MR/ES'), quantity=2, unit_price=Decimal('250.00'),
+        )
+
+    def smtp(self, port=None):
+        return override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST=self.host, EMAIL_PORT=port or self.port, EMAIL_TIMEOUT=5,
+            EMAIL_USE_TLS=False, EMAIL_USE_SSL=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        )
+
+    def queue(self, **kwargs):
+        return outbox.queue_email(
+            "Discount request", "See the attached PDF.", ['sales@example.com'],
+            quotation=self.quotation, attach_quotation_pdf=True, **kwargs,
+        )
+
+    def make_due(self, row):
+        OutboxEmail.objects.filter(pk=row.pk).update(next_attempt_at=timezone.now())
+
+    def test_delivers_with_pdf_attached(self):
+        row = self.queue()
+        with self.smtp():
+            self.assertEqual(outbox.drain(), (1, 0))
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (OutboxStatus.SENT, 1))
+        [message] = self.sink.messages
+        self.assertEqual(message['To'], 'sales@example.com')
+        [attachment] = list(message.iter_attachments())
+        self.assertEqual(attachment.get_filename(), 'quotation_Q-100.pdf')
+        self.assertEqual(attachment.get_content_type(), 'application/pdf')
+        self.assertTrue(attachment.get_content().startswith(b'%PDF'))
+
+    def test_failed_send_is_retried(self):
+        row = self.queue()
+        with self.smtp(port=unused_port()), self.assertLogs('eshop.outbox', 'WARNING'):
+            self.assertEqual(outbox.drain(), (0, 1))
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (OutboxStatus.PENDING, 1))
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        self.assertTrue(row.last_error)
+        with self.smtp():
+            # Backing off: not due yet.
+            self.assertEqual(outbox.drain(), (0, 0))
+            self.make_due(row)
+            self.assertEqual(outbox.drain(), (1, 0))
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts, row.last_error), (OutboxStatus.SENT, 2, ''))
+        self.assertEqual(len(self.sink.messages), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        row = self.queue()
+        OutboxEmail.objects.filter(pk=row.pk).update(max_attempts=2)
+        with self.smtp(port=unused_port()), self.assertLogs('eshop.outbox', 'WARNING') as logs:
+            for _ in range(2):
+                self.make_due(row)
+                outbox.drain()
+        self.assertIn('Giving up', logs.output[-1])
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (OutboxStatus.FAILED, 2))
+        with self.smtp():
+            self.make_due(row)
+            self.assertEqual(outbox.drain(), (0, 0))
+        self.assertEqual(self.sink.messages, [])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Repeated prices, so pages have to break ties on id.
+        prices = ['10.00', '25.50', '10.00', '99.99', '25.50', '10.00', '5.00', '25.50', '99.99', '1.00', '10.00']
+        for i, price in enumerate(prices):
+            make_product(f'FX5U-{i:02d}MT', price, name=f'FX5U servo module {i}',
+                         brand=Brand.objects.get_or_create(name='Mitsubishi')[0])
+        # Same number of words in every column, so these BM25 scores tie.
+        for suffix in 'ABCD':
+            make_product(f'GT2107-{suffix}', '300.00', name=f'FX5U servo module {suffix}')
+
+    def walk(self, fetch):
+        """All rows reached by following next_cursor from the first page."""
+        rows, cursor, pages = [], None, 0
+        while True:
+            page = fetch(cursor)
+            rows.extend(product.pk for product in page)
+            pages += 1
+            if not page.has_next:
+                return rows, pages
+            cursor = page.next_cursor
+
+    def test_price_pages_cover_every_row_once(self):
+        expected = list(Product.objects.order_by('original_price', 'id').values_list('pk', flat=True))
+        for page_size in (1, 3, 4, len(expected)):
+            rows, pages = self.walk(lambda cursor: paginate_keyset(
+                Product.objects.all(), sort='price', cursor=cursor, page_size=page_size,
+            ))
+            self.assertEqual(rows, expected)
+            self.assertEqual(pages, -(-len(expected) // page_size))
+
+    def test_search_rank_pages_cover_every_row_once(self):
+        expected = [product.pk for product in search_products('fx5u servo', page_size=100)]
+        self.assertEqual(len(expected), Product.objects.count())
+        for page_size in (1, 2, 5):
+            rows, _ = self.walk(lambda cursor: search_products('fx5u servo', cursor=cursor, page_size=page_size))
+            self.assertEqual(rows, expected)
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        first = [product.pk for product in paginate_keyset(Product.objects.all(), sort='price', page_size=3)]
+        first_ranked = [product.pk for product in search_products('fx5u servo', page_size=3)]
+        for cursor in ('not a cursor', '!!!', encode_cursor([]), encode_cursor(['cheap', 'x'])):
+            with self.subTest(cursor=cursor):
+                page = paginate_keyset(Product.objects.all(), sort='price', cursor=cursor, page_size=3)
+                self.assertEqual([product.pk for product in page], first)
+                self.assertIsNone(page.cursor)
+                page = search_products('fx5u servo', cursor=cursor, page_size=3)
+                self.assertEqual([product.pk for product in page], first_ranked)
+                self.assertIsNone(page.cursor)
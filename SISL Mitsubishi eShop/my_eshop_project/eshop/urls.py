@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, api_views
 
 urlpatterns = [
     path('', views.home_view, name='home'),
@@ -10,8 +10,19 @@ urlpatterns = [
     path('brand/<int:brand_id>/', views.brand_detail_view, name='brand_detail'),
     path('search/', views.search_view, name='search'),
     path('ask-discount/<str:sku>/', views.ask_for_discount_view, name='ask_for_discount'),
+    path('prices/<int:version>.json', views.price_map_view, name='price_map'),
     path('quotation/<int:pk>/', views.quotation_detail_view, name='quotation_detail'),
+    path('quotation/<int:pk>/pdf/', views.quotation_pdf_view, name='quotation_pdf'),
     path('order-management/', views.order_management_view, name='order_management'),
+    path('catalog-export/<str:fmt>/', views.catalog_export_view, name='catalog_export'),
     path('discount-submitted/', views.discount_submitted_view, name='discount_submitted'),
     path('discount-submitted/<int:quotation_id>/', views.discount_submitted_view, name='discount_submitted'),
+    path('discount-submitted/<int:quotation_id>/status/', views.discount_documents_status_view, name='discount_documents_status'),
+    path('api/products/', api_views.ProductListAPIView.as_view(), name='api_product_list'),
+    path('api/products/batch/', api_views.ProductBatchLookupAPIView.as_view(), name='api_product_batch'),
+    path('api/products/search/', api_views.ProductSearchAPIView.as_view(), name='api_product_search'),
+    path('api/products/changes/', api_views.ProductChangesAPIView.as_view(), name='api_product_changes'),
+    path('api/products/<int:pk>/', api_views.ProductDetailAPIView.as_view(), name='api_product_detail'),
+    path('api/products/<str:sku>/compatibility/', api_views.ProductCompatibilityAPIView.as_view(), name='api_product_compatibility'),
+    path('api/autocomplete/', api_views.ProductAutocompleteAPIView.as_view(), name='api_autocomplete'),
 ]
@@ -1,40 +1,144 @@
-import os
+import hashlib
 import json
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib import messages
-from django.conf import settings
-from django.core.mail import EmailMessage
+from django.db import transaction
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from django.contrib.admin.views.decorators import staff_member_required
 from django.template.response import TemplateResponse
 from django.template.loader import render_to_string
-import pdfkit  # Using pdfkit for PDF generation via wkhtmltopdf
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
 
-from .models import Category, Banner, Brand, Product, Quotation
+from .catalog_cache import CATALOG_CACHE_TIMEOUT, PRICES, get_version, versioned_key
+from .export import EXPORT_FORMATS, export_response
+from .facets import price_band_filter, sidebar_facets
+from .graph import compatibility, compatible_products, reachable_ids
+from .models import Category, CategoryFacet, Banner, Brand, JobStatus, Product, Quotation
+from .pagination import paginate_keyset
+from .pdf import download_name, generate_pdf_file
+from .fuzzy import suggest_products
+from .search import RELEVANCE, search_products
+from .tasks import QUOTATION_DOCUMENTS, queue_quotation_documents
 from .forms import BrandForm, ProductForm, QuotationHeaderForm, QuotationLineFormSet
 
 
+def _home_context():
+    """
+    Catalog data for the home page, evaluated once per catalog version.
+    Sub-categories are prefetched so the template's cat.children.all is free.
+    """
+    key = versioned_key('home', 'context')
+    context = cache.get(key)
+    if context is None:
+        context = {
+            'categories': list(
+                Category.objects.filter(parent__isnull=True).prefetch_related('children')
+            ),
+            'banner': Banner.objects.first(),
+            'vfd_products': list(Product.objects.filter(category__name__iexact='VFD').order_by('-id')[:8]),
+            'plc_products': list(Product.objects.filter(category__name__iexact='PLC').order_by('-id')[:8]),
+            'hmi_products': list(Product.objects.filter(category__name__iexact='HMI').order_by('-id')[:8]),
+        }
+        cache.set(key, context, CATALOG_CACHE_TIMEOUT)
+    return context
+
+
 def home_view(request):
-    categories = Category.objects.filter(parent__isnull=True)
-    banner = Banner.objects.first()
-    vfd_products = Product.objects.filter(category__name__iexact='VFD').order_by('-id')[:8]
-    plc_products = Product.objects.filter(category__name__iexact='PLC').order_by('-id')[:8]
-    hmi_products = Product.objects.filter(category__name__iexact='HMI').order_by('-id')[:8]
-    return render(request, 'home.html', {
-        'categories': categories,
-        'banner': banner,
-        'vfd_products': vfd_products,
-        'plc_products': plc_products,
-        'hmi_products': hmi_products,
-    })
+    """
+    The rendered page is cached per catalog version; base.html only varies on
+    whether the visitor is staff, so that flag is part of the key.
+    """
+    key = versioned_key('home', 'page', int(request.user.is_staff))
+    content = cache.get(key)
+    if content is None:
+        content = render_to_string('home.html', _home_context(), request=request)
+        cache.set(key, content, CATALOG_CACHE_TIMEOUT)
+    return HttpResponse(content)
+
+
+def _product_validators(request, sku):
+    """
+    (etag, last_modified) for a product page, or None if the SKU is unknown.
+    The page shows the product, its brand and its related products, all of
+    which move the product's updated_at (see eshop/signals.py), plus the
+    products reachable in the compatibility graph, whose newest updated_at is
+    one more aggregate; the result is cached per catalog version.
+    """
+    if not hasattr(request, '_product_validators'):
+        key = versioned_key('product', 'validators', sku)
+        validators = cache.get(key)
+        if validators is None:
+            row = (
+                Product.objects.filter(sku=sku)
+                .annotate(related_updated_at=Max('related_products__updated_at'))
+                .values('pk', 'updated_at', 'related_updated_at')
+                .first()
+            )
+            validators = ()
+            if row:
+                # A link change touches both ends, so this also moves when a
+                # hop further along the graph is added or removed.
+                graph_ids = reachable_ids(compatibility(row['pk']))
+                graph_updated_at = (
+                    Product.objects.filter(pk__in=graph_ids).aggregate(latest=Max('updated_at'))['latest']
+                    if graph_ids else None
+                )
+                last_modified = max(filter(None, [row['updated_at'], row['related_updated_at'], graph_updated_at]))
+                digest = hashlib.md5(
+                    f"{row['pk']}:{row['updated_at'].isoformat()}:{last_modified.isoformat()}".encode()
+                ).hexdigest()
+                validators = (digest, last_modified)
+            cache.set(key, validators, CATALOG_CACHE_TIMEOUT)
+        request._product_validators = validators or None
+    return request._product_validators
+
+
+def _product_etag(request, sku):
+    validators = _product_validators(request, sku)
+    if validators:
+        # base.html differs for staff, so they get their own tag.
+        return f"{validators[0]}-{int(request.user.is_staff)}"
+    return None
+
+
+def _product_last_modified(request, sku):
+    validators = _product_validators(request, sku)
+    return validators[1] if validators else None
 
 
+@condition(etag_func=_product_etag, last_modified_func=_product_last_modified)
 def product_detail_view(request, sku):
+    """
+    Answers If-None-Match/If-Modified-Since with a 304 via @condition. The page
+    body is cached per product version, so a full render on a cache hit only
+    runs base.html.
+    """
     if not sku or sku.lower() == 'none':
         return redirect('home')
-    product = get_object_or_404(Product, sku=sku)
-    return render(request, 'product_detail.html', {'product': product})
+    validators = _product_validators(request, sku)
+    if not validators:
+        raise Http404("No Product matches the given query.")
+    # The digest already changes with the product, so unrelated catalog edits keep this entry.
+    key = f"eshop:product:body:{sku}:{validators[0]}"
+    body = cache.get(key)
+    if body is None:
+        product = get_object_or_404(
+            Product.objects.select_related('brand', 'category').prefetch_related('related_products'),
+            sku=sku,
+        )
+        context = {
+            'product': product,
+            'compatibility': compatible_products(product.pk),
+        }
+        body = render_to_string('partials/_product_detail_body.html', context, request=request)
+        cache.set(key, body, CATALOG_CACHE_TIMEOUT)
+    return render(request, 'product_detail.html', {'body': mark_safe(body)})
 
 
 def fx_series_view(request):
@@ -47,12 +151,96 @@ def vfd_view(request):
     return render(request, 'vfd.html')
 
 
+PRODUCT_SORT_LABELS = [
+    ('name', 'Name'),
+    ('price', 'Price: low to high'),
+    ('newest', 'Newest'),
+]
+
+
+def _paginate_products(request, queryset):
+    """One keyset page of `queryset`, driven by the ?sort= and ?cursor= params."""
+    return paginate_keyset(
+        queryset,
+        sort=request.GET.get('sort'),
+        cursor=request.GET.get('cursor'),
+    )
+
+
+def _page_url(request, page, cursor):
+    """Current URL with the sort pinned and the cursor swapped for `cursor`."""
+    params = request.GET.copy()
+    params['sort'] = page.sort
+    params.pop('cursor', None)
+    if cursor:
+        params['cursor'] = cursor
+    return f"{request.path}?{params.urlencode()}"
+
+
+def _pager_context(request, page):
+    # Query params the sort form must carry over (search terms, facet filters).
+    hidden_params = [
+        (name, value) for name, value in request.GET.items() if name not in ('sort', 'cursor')
+    ]
+    if not page:
+        return {'page': page, 'first_url': None, 'next_url': None, 'hidden_params': hidden_params}
+    return {
+        'hidden_params': hidden_params,
+        'page': page,
+        'first_url': _page_url(request, page, None) if page.cursor else None,
+        'next_url': _page_url(request, page, page.next_cursor) if page.has_next else None,
+    }
+
+
+def _facet_url(request, param, value):
+    """Current URL with `param` toggled to `value` and pagination reset."""
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    if params.get(param) == value:
+        params.pop(param)
+    else:
+        params[param] = value
+    return f"{request.path}?{params.urlencode()}" if params else request.path
+
+
 def category_filter_view(request, cat_name):
-    """Filters products by category."""
-    products = Product.objects.filter(category__name__iexact=cat_name)
+    """
+    Filters products by category, including every sub-category below it,
+    optionally narrowed by ?brand=<id> and ?price=<band>. The facet sidebar
+    comes from the precomputed counts in eshop/facets.py.
+    """
+    category = Category.objects.filter(name__iexact=cat_name).first()
+    facet_groups = {}
+    if category:
+        products = Product.objects.in_category(category)
+        breadcrumbs = category.get_breadcrumbs()
+        brand = request.GET.get('brand', '')
+        if brand.isdigit():
+            products = products.filter(brand_id=int(brand))
+        price_filter = price_band_filter(request.GET.get('price', ''))
+        if price_filter is not None:
+            products = products.filter(price_filter)
+        facet_groups = sidebar_facets(category)
+        for row in facet_groups[CategoryFacet.BRAND]:
+            row.url = _facet_url(request, 'brand', row.value)
+            row.active = request.GET.get('brand') == row.value
+        for row in facet_groups[CategoryFacet.PRICE]:
+            row.url = _facet_url(request, 'price', row.value)
+            row.active = request.GET.get('price') == row.value
+    else:
+        products = Product.objects.none()
+        breadcrumbs = []
+    page = _paginate_products(request, products)
     return render(request, 'category_filter.html', {
         'cat_name': cat_name,
-        'products': products,
+        'category': category,
+        'breadcrumbs': breadcrumbs,
+        'products': page,
+        'child_facets': facet_groups.get(CategoryFacet.CHILD, []),
+        'brand_facets': facet_groups.get(CategoryFacet.BRAND, []),
+        'price_facets': facet_groups.get(CategoryFacet.PRICE, []),
+        'sort_options': PRODUCT_SORT_LABELS,
+        **_pager_context(request, page),
     })
 
 
@@ -63,12 +251,25 @@ def brand_detail_view(request, brand_id):
 
 
 def search_view(request):
-    """Simple search functionality."""
-    query = request.GET.get('q', '')
-    products = Product.objects.filter(name__icontains=query) if query else []
+    """Full-text search over name, SKU, description, brand and category, ranked by relevance."""
+    query = request.GET.get('q', '').strip()
+    page = None
+    suggestions = []
+    if query:
+        page = search_products(
+            query,
+            sort=request.GET.get('sort') or RELEVANCE,
+            cursor=request.GET.get('cursor'),
+        )
+        if not page and not page.cursor:
+            # Nothing matched word-for-word; try the part number trigram index.
+            suggestions = suggest_products(query)
     return render(request, 'search.html', {
         'query': query,
-        'products': products,
+        'products': page or [],
+        'suggestions': suggestions,
+        'sort_options': [(RELEVANCE, 'Relevance')] + PRODUCT_SORT_LABELS,
+        **_pager_context(request, page),
     })
 
 
@@ -76,13 +277,11 @@ def search_view(request):
 def ask_for_discount_view(request, sku):
     """
     Handles the discount request form submission.
-    After successful submission, sets the shareable PDF URL in the session and redirects to discount_submitted.
+    After successful submission, queues the PDF and the email (eshop/tasks.py) and redirects to discount_submitted.
     """
     product = get_object_or_404(Product, sku=sku)
-    
-    # Build mapping: product ID -> original_price (as string)
-    product_prices = {str(p.pk): str(p.original_price) for p in Product.objects.all()}
-    product_prices_json = json.dumps(product_prices)
+    # The form fetches the id -> price map from price_map_view; only its URL goes in the page.
+    price_map_url = reverse('price_map', args=[get_version(PRICES)])
     
     if request.method == "POST":
         new_quote = Quotation()
@@ -102,41 +301,24 @@ def ask_for_discount_view(request, sku):
                 f"Discount Request for order no: {generated_order_number} on "
                 f"{timezone.now().strftime('%Y-%m-%d')}"
             )
-            new_quote.save()
-            formset.save()
-            if hasattr(new_quote, "compute_total"):
-                new_quote.compute_total()
-            
-            # Generate PDF and send email using pdfkit (wkhtmltopdf)
-            pdf_file_path, pdf_file_name = generate_pdf_file(new_quote)
-            shareable_file_url = os.path.join(settings.MEDIA_URL, "quotations", pdf_file_name)
-            subject_email = f"Discount request for {product.name}"
-            body = (
-                f"User {request.user} requested a multi-line discount.\n"
-                f"Quotation ID: {new_quote.pk}\n\n"
-                f"Please find the attached PDF for full details."
-            )
-            email = EmailMessage(
-                subject=subject_email,
-                body=body,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[settings.DEFAULT_FROM_EMAIL],
-            )
-            email.attach_file(pdf_file_path)
-            email.send()
+            with transaction.atomic():
+                new_quote.save()
+                # Saving the lines keeps total_amount current (eshop/signals.py).
+                formset.save()
+                # The PDF job (run_jobs) and the outbox email (send_outbox) commit with
+                # the quotation, so neither runs for a missing one and no SMTP here.
+                queue_quotation_documents(new_quote, product, request.user)
             
             messages.success(
                 request,
-                f"Your discount request for Order No: {new_quote.order_number} has been successfully submitted! A PDF has been emailed."
+                f"Your discount request for Order No: {new_quote.order_number} has been successfully submitted! A PDF will be emailed shortly."
             )
-            # Save the shareable file URL in the session so discount_submitted_view can access it
-            request.session['shareable_file_url'] = shareable_file_url
             return redirect("discount_submitted", quotation_id=new_quote.pk)
         else:
             return render(request, "new_discount.html", {
                 "header_form": header_form,
                 "formset": formset,
-                "product_prices_json": product_prices_json,
+                "price_map_url": price_map_url,
             })
     else:
         new_quote = Quotation()
@@ -154,37 +336,39 @@ def ask_for_discount_view(request, sku):
         return render(request, "new_discount.html", {
             "header_form": header_form,
             "formset": formset,
-            "product_prices_json": product_prices_json,
+            "price_map_url": price_map_url,
         })
 
 
-def generate_pdf_file(quotation):
+# The URL carries the version, so a response never goes stale.
+PRICE_MAP_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def price_map_view(request, version):
     """
-    Generates a PDF file using wkhtmltopdf (via pdfkit).
-    Renders an HTML template ('quotation_pdf.html') with the quotation data,
-    saves the PDF under MEDIA_ROOT/quotations, and returns (pdf_file_path, pdf_file_name).
+    {product id: original price} for the discount form, as JSON. Built once
+    per price version and cached; older versions redirect to the current URL.
     """
-    # Render the HTML template into a string
-    html_string = render_to_string('quotation_pdf.html', {'quotation': quotation})
-    
-    timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
-    file_name = f"quotation_{quotation.pk}_{timestamp}.pdf"
-    quotations_dir = os.path.join(settings.MEDIA_ROOT, "quotations")
-    os.makedirs(quotations_dir, exist_ok=True)
-    file_path = os.path.join(quotations_dir, file_name)
-    
-    # Configure pdfkit with the path to wkhtmltopdf executable (update the path if needed)
-    config = pdfkit.configuration(wkhtmltopdf=r'C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe')
-    
-    # Generate the PDF file from the HTML string
-    pdfkit.from_string(html_string, file_path, configuration=config)
-    
-    return file_path, file_name
+    current = get_version(PRICES)
+    if version != current:
+        response = redirect('price_map', version=current)
+        response['Cache-Control'] = 'no-cache'
+        return response
+    key = versioned_key('price-map', name=PRICES)
+    content = cache.get(key)
+    if content is None:
+        prices = Product.objects.values_list('pk', 'original_price')
+        content = json.dumps({str(pk): str(price) for pk, price in prices}, separators=(',', ':'))
+        cache.set(key, content, CATALOG_CACHE_TIMEOUT)
+    response = HttpResponse(content, content_type='application/json')
+    response['Cache-Control'] = f'public, max-age={PRICE_MAP_MAX_AGE}, immutable'
+    return response
 
 
 @staff_member_required
 def order_management_view(request):
-    orders = Quotation.objects.all().order_by("-created_at")
+    # Line count, gross, discount and net come from the same query as the orders.
+    orders = Quotation.objects.with_totals().select_related("customer").order_by("-created_at")
     status_filter = request.GET.get("status")
     if status_filter:
         orders = orders.filter(status=status_filter)
@@ -192,26 +376,73 @@ def order_management_view(request):
     return TemplateResponse(request, "order_management.html", context)
 
 
+@staff_member_required
+def catalog_export_view(request, fmt):
+    """Streams the whole catalog as CSV or JSON Lines (see eshop/export.py)."""
+    if fmt not in EXPORT_FORMATS:
+        raise Http404("Unknown export format.")
+    return export_response(fmt)
+
+
 def quotation_detail_view(request, pk):
-    quotation = get_object_or_404(Quotation, pk=pk)
+    quotation = get_object_or_404(Quotation.objects.with_totals(), pk=pk)
     return render(request, "quotation_detail.html", {
         "quotation": quotation,
-        "lines": quotation.lines.all(),
+        "lines": quotation.lines.with_amounts().select_related("product"),
     })
 
 
+def _documents_job(quotation):
+    return quotation.jobs.filter(name=QUOTATION_DOCUMENTS).order_by('-id').first()
+
+
+def _documents_state(job):
+    """What discount_submitted shows for the quotation's PDF job."""
+    if job is None:
+        return {"state": None, "pdf_url": None}
+    return {
+        "state": job.status,
+        "state_display": job.get_status_display(),
+        "attempts": job.attempts,
+        "pdf_url": job.result.get("pdf_url") if job.status == JobStatus.DONE else None,
+    }
+
+
+@staff_member_required
+def quotation_pdf_view(request, pk):
+    """Downloads the quotation PDF; served from the render cache unless the quotation changed."""
+    quotation = get_object_or_404(Quotation, pk=pk)
+    pdf_file_path, _ = generate_pdf_file(quotation)
+    return FileResponse(
+        open(pdf_file_path, 'rb'), as_attachment=True,
+        filename=download_name(quotation), content_type='application/pdf',
+    )
+
+
 @login_required
 def discount_submitted_view(request, quotation_id):
     """
     Displays the success page with quotation details.
-    Retrieves the quotation by ID, and attempts to get the product (from the first line)
-    and shareable_file_url (stored in session).
+    Retrieves the quotation by ID, the product (from the first line) and the
+    state of the background job producing the PDF, linked once it is ready.
     """
-    quotation = get_object_or_404(Quotation, pk=quotation_id)
-    product = quotation.lines.first().product if quotation.lines.exists() else None
-    shareable_file_url = request.session.get('shareable_file_url', None)
+    quotation = get_object_or_404(Quotation.objects.with_totals(), pk=quotation_id)
+    lines = list(quotation.lines.with_amounts().select_related("product").order_by("pk"))
+    product = lines[0].product if lines else None
+    documents = _documents_state(_documents_job(quotation))
     return render(request, "discount_submitted.html", {
          "quotation": quotation,
+         "lines": lines,
          "product": product,
-         "shareable_file_url": shareable_file_url,
+         "documents": documents,
+         "shareable_file_url": documents["pdf_url"],
     })
+
+
+@login_required
+def discount_documents_status_view(request, quotation_id):
+    """JSON state of the PDF job, polled by discount_submitted.html until it settles."""
+    quotation = get_object_or_404(Quotation, pk=quotation_id)
+    response = JsonResponse(_documents_state(_documents_job(quotation)))
+    response["Cache-Control"] = "no-cache"
+    return response
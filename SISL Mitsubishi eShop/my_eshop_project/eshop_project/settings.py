@@ -2,6 +2,7 @@
 Django settings for eshop_project project.
 """
 
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -86,6 +87,30 @@ STATICFILES_DIRS = [BASE_DIR / 'eshop' / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# ---------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------
+# Catalog caches are invalidated through version counters stored in the cache
+# (see eshop/catalog_cache.py), so the backend must be shared by all worker
+# processes. Switch to Redis/Memcached in production if available.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    }
+}
+
+# ---------------------------------------------------------------------
+# Quotation PDFs
+# ---------------------------------------------------------------------
+# Rendered by eshop/pdf.py with 'wkhtmltopdf' (via pdfkit) or 'weasyprint'.
+# An empty PDF_ENGINE_BINARY looks wkhtmltopdf up on PATH; on Windows set
+# WKHTMLTOPDF_PATH, e.g. C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe.
+# PDF_RENDER_WORKERS caps the concurrent renders of each process.
+PDF_ENGINE = os.environ.get('PDF_ENGINE', 'wkhtmltopdf')
+PDF_ENGINE_BINARY = os.environ.get('WKHTMLTOPDF_PATH', '')
+PDF_RENDER_WORKERS = 2
+
 # ---------------------------------------------------------------------
 # Email Configuration for Production (Google Workspace)
 # ---------------------------------------------------------------------
@@ -102,5 +127,9 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Email Configuration for Development (Console Backend)
 # ---------------------------------------------------------------------
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# To exercise real SMTP delivery locally, run `manage.py smtp_sink` and use:
+# EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# EMAIL_HOST = '127.0.0.1'
+# EMAIL_PORT = 1025
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'